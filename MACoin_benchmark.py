@@ -0,0 +1,163 @@
+# MACoin Blockchain - benchmark suite
+# Measures the ledger hot paths (transfers, blocks, smart contracts, wallet histories, overviews) on chains of growing size
+# --> Chains are built through the same paths as the testing interface (UserInterface.create_test_wallets, create_test_transactions
+#     and create_test_contracts). Every size runs in a fresh worker process, so the reported peak memory belongs to that size only
+# --> Bulk transfers are measured as one transfer_many call against a loop of transfer_funds calls settling the same transfers
+# --> Proof-of-work mining is measured separately, at a fixed difficulty, and reported as hashes/sec in total and per core
+# --> Results are written as JSON, to compare runs and catch regressions
+#
+# Usage: python MACoin_benchmark.py --sizes 1000,10000,100000 --output benchmark_results.json
+#        python MACoin_benchmark.py --sizes 1000 --difficulty 20 --mining-blocks 10 --mining-workers 4
+
+import argparse
+import contextlib
+import datetime
+import json
+import os
+import platform
+import resource
+import secrets
+import sys
+import time
+from concurrent.futures import ProcessPoolExecutor
+
+from MACoin import UserInterface
+from MACoin_core import Blockchain, Block, Transfer
+
+
+# Timing of a single benchmarked operation: calls, ops/sec and latency percentiles
+def summarize(latencies, total_time):
+    latencies = sorted(latencies)
+    percentile = lambda p: latencies[min(len(latencies) - 1, int(p * len(latencies)))] if latencies else None
+    return {"calls": len(latencies),
+            "ops_per_sec": len(latencies) / total_time if total_time else None,
+            "p50_us": percentile(0.50) / 1000 if latencies else None,
+            "p99_us": percentile(0.99) / 1000 if latencies else None}
+
+
+# Call function(*arguments) once per argument tuple and time every call
+def measure(function, arguments):
+    latencies = []
+    start = time.perf_counter()
+    for args in arguments:
+        call_start = time.perf_counter_ns()
+        function(*args)
+        latencies.append(time.perf_counter_ns() - call_start)
+    return summarize(latencies, time.perf_counter() - start)
+
+
+# Time one of the build steps of the testing interface, reported per created item
+def measure_build(function, number):
+    start = time.perf_counter()
+    function(number)
+    total_time = time.perf_counter() - start
+    return {"calls": number, "ops_per_sec": number / total_time if total_time else None, "total_s": total_time}
+
+
+# Time a bulk operation settling number items in one go, reported per item
+def measure_bulk(function, number):
+    start = time.perf_counter()
+    function()
+    total_time = time.perf_counter() - start
+    return {"calls": number, "ops_per_sec": number / total_time if total_time else None, "total_s": total_time}
+
+
+# Run all benchmarks for one chain size, in a worker process
+# size is the number of transactions; the chain has size // 10 wallets and size // 100 contracts of each type
+def run_size(size, samples, batching):
+    results = {"size": size, "wallets": max(10, size // 10), "contracts": max(1, size // 100), "batching": batching, "operations": {}}
+    operations = results["operations"]
+    with open(os.devnull, "w") as devnull, contextlib.redirect_stdout(devnull): # the ledger prints a message for every operation
+        blockchain = Blockchain(batching=batching)
+        ui = UserInterface(blockchain, initiate=False)
+
+        # Build the chain through the testing interface
+        operations["create_test_wallets"] = measure_build(ui.create_test_wallets, results["wallets"])
+        operations["create_test_contracts"] = measure_build(ui.create_test_contracts, results["contracts"])
+        operations["create_test_transactions"] = measure_build(ui.create_test_transactions, size)
+        blockchain.flush_mempool()
+        results["blocks"] = len(blockchain.chain)
+
+        # Hot paths, on random wallets of the chain
+        addresses = list(blockchain.wallets.keys())
+        random = secrets.SystemRandom()
+        pairs = [random.sample(addresses, 2) for i in range(samples)]
+        operations["transfer_funds"] = measure(lambda sender, receiver: blockchain.transfer_funds(sender, receiver, 0.01, "Benchmark", testing=True), pairs)
+        blockchain.flush_mempool()
+        transfers = [(sender, receiver, 0.01, "Benchmark") for sender, receiver in pairs] # the same transfers, one by one and in one batch
+        operations["transfer_funds (loop)"] = measure_bulk(lambda: [blockchain.transfer_funds(*transfer, testing=True) for transfer in transfers], len(transfers))
+        blockchain.flush_mempool()
+        operations["transfer_many"] = measure_bulk(lambda: blockchain.transfer_many(transfers, testing=True), len(transfers))
+        results["transfer_many_speedup"] = operations["transfer_many"]["ops_per_sec"] / operations["transfer_funds (loop)"]["ops_per_sec"]
+        # Raw cost of appending a block (sealing and indexing), without the transfer validation: measured on a throwaway chain,
+        # so the benchmarked chain only holds transactions the ledger accepted
+        scratch = Blockchain()
+        scratch_pair = [wallet for wallet, phrase in scratch.create_wallets(2)]
+        operations["add_block (raw, scratch chain)"] = measure(lambda sender, receiver: scratch.add_block(Transfer(sender, receiver, 1, "Benchmark", Block.now())), [scratch_pair] * samples)
+        operations["execute_contract (triggered)"] = measure(lambda sender, receiver: blockchain.execute_contract(blockchain.triggered_contracts(Transfer(sender, receiver, blockchain.to_units(20), "Benchmark", Block.now()))), pairs)
+        operations["execute_contract (full scan)"] = measure(blockchain.execute_contract, [()] * min(samples, 20))
+        try: # the analytics need pandas and NumPy
+            operations["get_wallet_transactions"] = measure(blockchain.get_wallet_transactions, [(pair[0],) for pair in pairs])
+            operations["get_wallets_overview"] = measure(blockchain.get_wallets_overview, [()] * min(samples, 5))
+            operations["get_all_transactions"] = measure(blockchain.get_all_transactions, [()] * min(samples, 5))
+        except ImportError as e:
+            results["skipped"] = f"Analytics not benchmarked: {e}"
+
+    results["chain_length"] = len(blockchain.chain)
+    results["peak_rss_kb"] = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss # peak memory of the worker process
+    return results
+
+
+# Mine blocks at a fixed difficulty (the retargeting is disabled), returns the hash rate of the mining engine
+def run_mining(difficulty, blocks, workers):
+    with open(os.devnull, "w") as devnull, contextlib.redirect_stdout(devnull):
+        blockchain = Blockchain(proof_of_work=True, difficulty=difficulty, retarget_interval=blocks + 1, mining_workers=workers)
+        sender, receiver = blockchain.create_wallet(testing=True), blockchain.create_wallet(testing=True)
+        start = time.perf_counter()
+        for i in range(blocks):
+            blockchain.transfer_funds(sender, receiver, 0.01, "Benchmark", testing=True)
+        total_time = time.perf_counter() - start
+        blockchain.close()
+    results = blockchain.miner.hash_rate()
+    results.update({"difficulty": difficulty, "blocks": blocks, "seconds_per_block": total_time / blocks})
+    return results
+
+
+# Run the benchmark for every size and write the results to a JSON file
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Benchmark the MACoin ledger hot paths on chains of growing size.")
+    parser.add_argument("--sizes", default="1000,10000,100000", help="comma separated numbers of transactions, e.g. 1000,10000,100000,1000000")
+    parser.add_argument("--samples", type=int, default=1000, help="number of timed calls per operation")
+    parser.add_argument("--batching", action="store_true", help="pack transfers into multi-transaction blocks")
+    parser.add_argument("--output", default="benchmark_results.json", help="file the JSON results are written to")
+    parser.add_argument("--difficulty", type=int, default=16, help="proof-of-work difficulty (leading zero bits) of the mining benchmark, 0 to skip it")
+    parser.add_argument("--mining-blocks", type=int, default=5, help="number of blocks mined by the mining benchmark")
+    parser.add_argument("--mining-workers", type=int, default=None, help="number of mining processes (default: all cores)")
+    args = parser.parse_args(argv)
+
+    report = {"created": datetime.datetime.now().isoformat(), "python": sys.version.split()[0], "platform": platform.platform(),
+              "samples": args.samples, "results": []}
+    for size in [int(size) for size in args.sizes.split(",")]:
+        with ProcessPoolExecutor(max_workers=1) as pool: # fresh process for every size
+            results = pool.submit(run_size, size, args.samples, args.batching).result()
+        report["results"].append(results)
+        print(f"Size {size}: {results['blocks']} blocks, peak memory {results['peak_rss_kb'] / 1024:.1f} MB, "
+              f"transfer_many {results['transfer_many_speedup']:.1f} times the transfer_funds loop")
+        for name, timing in results["operations"].items():
+            if "p50_us" in timing:
+                print(f"    {name:<30} {timing['ops_per_sec']:>12.1f} ops/s   p50 {timing['p50_us']:>10.1f} us   p99 {timing['p99_us']:>10.1f} us")
+            else:
+                print(f"    {name:<30} {timing['ops_per_sec']:>12.1f} ops/s   total {timing['total_s']:>8.2f} s")
+
+    if args.difficulty:
+        report["mining"] = mining = run_mining(args.difficulty, args.mining_blocks, args.mining_workers)
+        print(f"Mining at difficulty {mining['difficulty']}: {mining['hashes_per_second']:.0f} hashes/s, "
+              f"{mining['hashes_per_second_per_core']:.0f} hashes/s per core ({mining['workers']} workers), {mining['seconds_per_block']:.2f} s per block")
+
+    with open(args.output, "w") as f:
+        json.dump(report, f, indent=2)
+    print(f"Results written to {args.output}.")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,2904 @@
+# MACoin Blockchain - core ledger
+# Wallets, blocks, smart contracts and the blockchain itself, usable without the User Interface (e.g. in batch workers)
+# --> Only the standard library is imported here. NumPy, pandas, IPython and graphviz are imported inside the analytics, print and display
+#     functions, on their first use, so importing the ledger never pulls in the display stack
+# --> The hot paths are instrumented through the metrics registry of MACoin_metrics.py (standard library only as well)
+
+import hashlib
+import decimal
+import bisect
+import itertools
+import sys
+import math
+import time
+import datetime
+import secrets
+import os
+import mmap
+import pickle
+import struct
+import array
+import collections
+import threading
+import contextlib
+import multiprocessing
+import weakref
+from concurrent.futures import ProcessPoolExecutor, wait, FIRST_COMPLETED
+from typing import NamedTuple
+
+from MACoin_metrics import metrics, count_buckets
+
+# Contracts evaluated and fired per evaluation round that evaluated at least one contract (one round per block, or per transaction of a batched block)
+contracts_evaluated = metrics.histogram("macoin_contracts_evaluated", "Smart contracts evaluated per evaluation round", count_buckets)
+contracts_fired = metrics.histogram("macoin_contracts_fired", "Smart contracts paying out per evaluation round", count_buckets)
+
+# Time to seal every new block: encode its transactions, compute their Merkle root and the block hash, and mine it with proof of work
+block_sealing = metrics.histogram("macoin_block_seal_seconds", "Time to encode, hash and (with proof of work) mine a new block, in seconds")
+
+# Call counts and latency of the paths run for every transfer and block, observed inline rather than with metrics.timed (which adds a
+# function call to each of them), in the macoin_call_duration_seconds family next to the decorated functions
+def call_duration(name):
+    return metrics.histogram("macoin_call_duration_seconds", "Latency of the instrumented ledger functions, in seconds", labels=(("function", name),))
+
+transfer_duration = call_duration("transfer_funds")
+add_block_duration = call_duration("add_block")
+contract_duration = call_duration("execute_contract")
+
+
+
+############################################################################################
+####################################### Wallet Class #######################################
+############################################################################################
+
+# Random words for the recovery phrases, consisting of 100 words
+recovery_words = (
+    'after', 'air', 'always', 'angry', 'apple', 'bad', 'ball', 'banana', 'bed', 'before',
+    'big', 'bird', 'book', 'car', 'cat', 'choices', 'close', 'cold', 'cry', 'day',
+    'dog', 'drink', 'early', 'earth', 'eat', 'excuse', 'family', 'fast', 'feel', 'fire',
+    'first', 'fish', 'food', 'friend', 'good', 'goodbye', 'happy', 'hat', 'hate', 'hear',
+    'hello', 'help', 'here', 'hot', 'house', 'hungry', 'jump', 'last', 'late', 'laugh',
+    'learn', 'love', 'luck', 'maybe', 'month', 'moon', 'never', 'new', 'next', 'night',
+    'no', 'now', 'old', 'open', 'options', 'play', 'please', 'run', 'sad', 'see',
+    'sit', 'sleep', 'slow', 'small', 'smile', 'soon', 'sorry', 'stand', 'star', 'start',
+    'stop', 'sun', 'talk', 'thank', 'then', 'there', 'thirsty', 'time', 'tired', 'touch',
+    'tree', 'walk', 'water', 'week', 'welcome', 'work', 'year', 'yes', 'you', 'young')
+
+
+# Individual wallets
+# --> Balances and amounts are integers, in minor units of the coin (see Blockchain.scale)
+class Wallet:
+    __slots__ = ("address", "balance", "password", "phrase", "creation_date", "lock") # No per-wallet __dict__
+
+    def __init__(self, address, password, phrase, creation_date, starting_balance=0): # Initialize wallet with address, password, recovery phrase, creation date, and starting balance
+        self.address = address
+        self.balance = starting_balance
+        self.password = password
+        self.phrase = phrase
+        self.creation_date = creation_date 
+        self.lock = threading.RLock() # Held while the balance is checked and changed (see Blockchain.wallet_locks)
+
+
+    # Locks cannot be pickled: the wallet is saved without its lock, and gets a new one when loaded
+    def __getstate__(self):
+        return {name: getattr(self, name) for name in self.__slots__ if name != "lock"}
+
+
+    def __setstate__(self, state):
+        for name, value in state.items():
+            setattr(self, name, value)
+        self.lock = threading.RLock()
+
+
+    # Add amount (in minor units) to wallet balance
+    def add_amount(self, amount):
+        with self.lock:
+            self.balance += amount
+
+
+    # Deduct amount (in minor units) from wallet balance
+    def deduct_amount(self, amount): 
+        with self.lock: # the balance check and the deduction must not be interleaved with another thread
+            if self.balance >= amount:
+                self.balance -= amount
+            else: # retun error message if balance not high enough
+                raise ValueError("Insufficient balance.")
+
+
+
+############################################################################################
+################################### Transaction Records ####################################
+############################################################################################
+# Typed records for the kinds of transactions a block can hold
+# --> Records are named tuples: immutable, without a per-instance __dict__, with fields accessible by name or position
+# --> Readers dispatch on the record's tag (the same tag that starts its binary encoding, see Block.encode_transaction)
+# --> Addresses and contract names are interned strings, shared with the wallets and contracts; timestamps are integer microseconds since 1970-01-01
+
+# Transfer of funds between two wallets
+class Transfer(NamedTuple):
+    sender: str
+    receiver: str
+    amount: int # Minor units of the coin (see Blockchain.scale)
+    data: str # Reference of the transfer
+    timestamp: int # Microseconds since the epoch (see Block.decode_timestamp)
+    tag = 0
+
+
+# Signature of a smart contract by a wallet
+class ContractSignature(NamedTuple):
+    contract_name: str
+    address: str
+    timestamp: int # Microseconds since the epoch (see Block.decode_timestamp)
+    tag = 1
+
+
+# Payment made by a smart contract from one of its parties to the receiver named in its conditions
+class ContractPayout(NamedTuple):
+    contract_name: str
+    sender: str
+    receiver: str
+    amount: int # Minor units of the coin (see Blockchain.scale)
+    timestamp: int # Microseconds since the epoch (see Block.decode_timestamp)
+    tag = 2
+
+
+# Creation of a wallet, with the starting balance it receives
+class WalletCreation(NamedTuple):
+    address: str
+    balance: int # Minor units of the coin (see Blockchain.scale)
+    timestamp: int # Microseconds since the epoch (see Block.decode_timestamp)
+    tag = 3
+
+
+# Deletion of a wallet, with the balance it held (which leaves the supply)
+class WalletDeletion(NamedTuple):
+    address: str
+    balance: int # Minor units of the coin (see Blockchain.scale)
+    timestamp: int # Microseconds since the epoch (see Block.decode_timestamp)
+    tag = 4
+
+
+
+############################################################################################
+####################################### Block Class ########################################
+############################################################################################
+# Class for individual blocks on the chain, containing a timestamp, data, the previous block's hash value and the Merkle root of its transactions
+# --> One block contains one or more transactions (packed from the pending transaction pool). In instant mode (difficulty 0) it is sealed immediately
+#     upon execution; in proof-of-work mode its nonce is searched until its hash meets the difficulty target (see Miner)
+# --> Hashes are calculated over a canonical binary encoding of the block header and transactions (see to_bytes/from_bytes)
+# --> A block is stored as that encoding and nothing else: Block is an immutable bytes object whose fields are decoded on access
+class Block(bytes):
+    __slots__ = () # No per-block __dict__
+    epoch = datetime.datetime(1970, 1, 1) # Timestamps are encoded as integer microseconds since this date
+    microsecond = datetime.timedelta(microseconds=1)
+    header_format = struct.Struct("<q32s32sQBI") # Timestamp, previous hash, Merkle root, nonce, difficulty, length of the block data
+    nonce_format = struct.Struct("<Q")
+    nonce_offset = 72 # Position of the nonce in the header
+    transfer_format = struct.Struct("<BqqBBI") # Tag (0), amount (minor units), timestamp, lengths of sender and receiver (addresses, up to 255 bytes) and reference
+    signature_format = struct.Struct("<BqBB") # Tag (1), timestamp, lengths of contract name and address (up to 255 bytes)
+    payout_format = struct.Struct("<BqqBBB") # Tag (2), amount (minor units), timestamp, lengths of contract name, sender and receiver
+    wallet_format = struct.Struct("<BqqB") # Tag (3: creation, 4: deletion), balance (minor units), timestamp, length of the address
+    count_format = struct.Struct("<I") # Number of transactions in a serialized block
+
+    # Create a block from its timestamp (integer microseconds or datetime), data, the previous block's hash and its transactions
+    # difficulty is the number of leading zero bits its hash must have to be valid (0: instant mode, any hash is valid)
+    def __new__(cls, timestamp, data, previous_hash, transactions=None, nonce=0, difficulty=0):
+        if isinstance(timestamp, datetime.datetime):
+            timestamp = cls.encode_timestamp(timestamp)
+        encoded = [cls.encode_transaction(transaction) for transaction in transactions or ()]
+        data = str(data).encode()
+        header = cls.header_format.pack(timestamp, cls.encode_hash(previous_hash), cls.merkle_root_of(encoded), nonce, difficulty, len(data)) + data
+        # The block commits to its transactions through the Merkle root, and its hash value is the SHA256 hash of the header
+        return super().__new__(cls, b"".join([header, hashlib.sha256(header).digest(), cls.count_format.pack(len(encoded))] + encoded))
+
+
+    def __repr__(self):
+        return f"Block(data={self.data!r}, hash={self.hash!r})"
+
+    __str__ = __repr__
+
+
+    # Pickle blocks through their encoding
+    def __reduce__(self):
+        return (type(self).from_bytes, (bytes(self),))
+
+
+    # Header fields: timestamp, previous hash, Merkle root (raw bytes), nonce, difficulty and length of the block data
+    def header(self):
+        return self.header_format.unpack_from(self)
+
+
+    # Timestamp of the block, as integer microseconds since the epoch
+    @property
+    def timestamp(self):
+        return self.header()[0]
+
+
+    @property
+    def data(self):
+        data_length = self.header()[5]
+        return self[self.header_format.size:self.header_format.size + data_length].decode()
+
+
+    @property
+    def previous_hash(self):
+        return self.decode_hash(self.header()[1])
+
+
+    @property
+    def merkle_root(self):
+        return self.header()[2].hex()
+
+
+    @property
+    def nonce(self):
+        return self.header()[3]
+
+
+    @property
+    def difficulty(self):
+        return self.header()[4]
+
+
+    # Offset of the block's hash value in its encoding, right after the header and the block data
+    def hash_offset(self):
+        return self.header_format.size + self.header()[5]
+
+
+    @property
+    def hash(self):
+        offset = self.hash_offset()
+        return self[offset:offset + 32].hex()
+
+
+    # Transactions of the block, as Transfer and ContractSignature records
+    @property
+    def transactions(self):
+        return [self.decode_transaction(encoded)[0] for encoded in self.encoded_transactions()]
+
+
+    # Last transaction of the block (the only one for blocks holding a single transaction), empty list for the genesis block
+    @property
+    def transaction(self):
+        transactions = self.transactions
+        return transactions[-1] if transactions else []
+
+
+    # Current time as integer microseconds since the epoch
+    @classmethod
+    def now(cls):
+        return cls.encode_timestamp(datetime.datetime.now())
+
+
+    # Encode a timestamp as integer microseconds since the epoch
+    @classmethod
+    def encode_timestamp(cls, timestamp):
+        return (timestamp - cls.epoch) // cls.microsecond
+
+
+    # Decode integer microseconds since the epoch into a timestamp
+    @classmethod
+    def decode_timestamp(cls, microseconds):
+        return cls.epoch + datetime.timedelta(microseconds=microseconds)
+
+
+    # Encode a hexadecimal hash as 32 raw bytes (the genesis block's previous hash "0" is encoded as zero bytes)
+    @staticmethod
+    def encode_hash(hash_value):
+        return bytes(32) if hash_value == "0" else bytes.fromhex(hash_value)
+
+
+    # Decode 32 raw bytes into a hexadecimal hash
+    @staticmethod
+    def decode_hash(raw):
+        return "0" if raw == bytes(32) else raw.hex()
+
+
+    # Canonical binary encoding of a transaction record: a fixed-size part (type tag, numbers, string lengths) followed by the UTF-8 strings
+    @classmethod
+    def encode_transaction(cls, transaction):
+        if transaction.tag == ContractSignature.tag: # Contract signature: contract name, address, timestamp
+            contract_name, address = transaction.contract_name.encode(), transaction.address.encode()
+            return cls.signature_format.pack(ContractSignature.tag, transaction.timestamp, len(contract_name), len(address)) + contract_name + address
+        if transaction.tag == ContractPayout.tag: # Contract payout: contract name, sender, receiver, amount, timestamp
+            contract_name, sender, receiver = transaction.contract_name.encode(), transaction.sender.encode(), transaction.receiver.encode()
+            return (cls.payout_format.pack(ContractPayout.tag, transaction.amount, transaction.timestamp, len(contract_name), len(sender), len(receiver))
+                    + contract_name + sender + receiver)
+        if transaction.tag in (WalletCreation.tag, WalletDeletion.tag): # Wallet creation or deletion: address, balance, timestamp
+            address = transaction.address.encode()
+            return cls.wallet_format.pack(transaction.tag, transaction.balance, transaction.timestamp, len(address)) + address
+        sender, receiver, amount, data, timestamp = transaction # Transfer: sender, receiver, amount, reference, timestamp
+        sender, receiver, data = sender.encode(), receiver.encode(), str(data).encode()
+        return cls.transfer_format.pack(Transfer.tag, amount, timestamp, len(sender), len(receiver), len(data)) + sender + receiver + data
+
+
+    # Decode a transaction record starting at offset in buffer, returns the record and the offset right after it
+    # Addresses and contract names are interned, so every decoded record shares the same strings
+    @classmethod
+    def decode_transaction(cls, buffer, offset=0):
+        tag = buffer[offset]
+        if tag == ContractSignature.tag:
+            tag, timestamp, name_length, address_length = cls.signature_format.unpack_from(buffer, offset)
+            offset += cls.signature_format.size
+            contract_name = sys.intern(bytes(buffer[offset:offset + name_length]).decode())
+            address = sys.intern(bytes(buffer[offset + name_length:offset + name_length + address_length]).decode())
+            return ContractSignature(contract_name, address, timestamp), offset + name_length + address_length
+        if tag == ContractPayout.tag:
+            tag, amount, timestamp, name_length, sender_length, receiver_length = cls.payout_format.unpack_from(buffer, offset)
+            offset += cls.payout_format.size
+            contract_name = sys.intern(bytes(buffer[offset:offset + name_length]).decode())
+            offset += name_length
+            sender = sys.intern(bytes(buffer[offset:offset + sender_length]).decode())
+            offset += sender_length
+            receiver = sys.intern(bytes(buffer[offset:offset + receiver_length]).decode())
+            return ContractPayout(contract_name, sender, receiver, amount, timestamp), offset + receiver_length
+        if tag in (WalletCreation.tag, WalletDeletion.tag):
+            tag, balance, timestamp, address_length = cls.wallet_format.unpack_from(buffer, offset)
+            offset += cls.wallet_format.size
+            address = sys.intern(bytes(buffer[offset:offset + address_length]).decode())
+            record = WalletCreation if tag == WalletCreation.tag else WalletDeletion
+            return record(address, balance, timestamp), offset + address_length
+        tag, amount, timestamp, sender_length, receiver_length, data_length = cls.transfer_format.unpack_from(buffer, offset)
+        offset += cls.transfer_format.size
+        sender = sys.intern(bytes(buffer[offset:offset + sender_length]).decode())
+        offset += sender_length
+        receiver = sys.intern(bytes(buffer[offset:offset + receiver_length]).decode())
+        offset += receiver_length
+        data = bytes(buffer[offset:offset + data_length]).decode()
+        return Transfer(sender, receiver, amount, data, timestamp), offset + data_length
+
+
+    # Size of the encoded transaction starting at offset, read from the fixed-size part of its encoding (without decoding the strings)
+    def transaction_size(self, offset):
+        tag = self[offset]
+        if tag == ContractSignature.tag:
+            tag, timestamp, name_length, address_length = self.signature_format.unpack_from(self, offset)
+            return self.signature_format.size + name_length + address_length
+        if tag == ContractPayout.tag:
+            tag, amount, timestamp, name_length, sender_length, receiver_length = self.payout_format.unpack_from(self, offset)
+            return self.payout_format.size + name_length + sender_length + receiver_length
+        if tag in (WalletCreation.tag, WalletDeletion.tag):
+            return self.wallet_format.size + self[offset + self.wallet_format.size - 1]
+        tag, amount, timestamp, sender_length, receiver_length, data_length = self.transfer_format.unpack_from(self, offset)
+        return self.transfer_format.size + sender_length + receiver_length + data_length
+
+
+    # Encoded transactions of the block, split using the fixed-size part of each encoding
+    def encoded_transactions(self):
+        offset = self.hash_offset() + 32
+        count = self.count_format.unpack_from(self, offset)[0]
+        offset += self.count_format.size
+        encoded = []
+        for i in range(count):
+            size = self.transaction_size(offset)
+            encoded.append(self[offset:offset + size])
+            offset += size
+        return encoded
+
+
+    # Calculate a transaction's hash value: SHA256 hash of its canonical encoding
+    @classmethod
+    def calculate_transaction_hash(cls, transaction):
+        return hashlib.sha256(cls.encode_transaction(transaction)).digest()
+
+
+    # Merkle root of encoded transactions: transaction hashes are hashed pairwise until a single hash remains
+    # --> Leaves and inner nodes are hashed with different prefixes (0 and 1), so a pair of hashes can never pass for a transaction
+    # --> The last hash of a level with an odd number of hashes is promoted to the next level as is. It is not paired with a copy of itself,
+    #     which would give a block with its last transaction repeated the same root (and the same block hash)
+    @staticmethod
+    def merkle_root_of(encoded):
+        if not encoded: # Blocks without transactions commit to an empty root
+            return bytes(32)
+        level = [hashlib.sha256(b"\x00" + transaction).digest() for transaction in encoded]
+        while len(level) > 1:
+            paired = [hashlib.sha256(b"\x01" + level[i] + level[i + 1]).digest() for i in range(0, len(level) - 1, 2)]
+            level = paired + level[-1:] if len(level) % 2 == 1 else paired
+        return level[0]
+
+
+    # Recalculate the Merkle root of the block's transactions
+    def calculate_merkle_root(self):
+        return self.merkle_root_of(self.encoded_transactions()).hex()
+
+
+    # Canonical binary encoding of the block header: timestamp, previous hash, Merkle root and block data
+    def header_bytes(self):
+        return self[:self.hash_offset()]
+
+
+    # Calculate a block's hash value: hexadecimal SHA256 hash of the canonical header encoding (which commits to the transactions through the Merkle root)
+    def calculate_hash(self):
+        return hashlib.sha256(self.header_bytes()).hexdigest()
+
+
+    # Whether a hash value (raw bytes) has at least difficulty leading zero bits
+    @staticmethod
+    def meets_target(digest, difficulty):
+        return int.from_bytes(digest, "big") >> (256 - difficulty) == 0
+
+
+    # Whether the block's hash value meets its difficulty (always true for blocks created in instant mode)
+    def meets_difficulty(self):
+        offset = self.hash_offset()
+        return self.meets_target(self[offset:offset + 32], self.difficulty)
+
+
+    # The same block with another nonce, and its hash value recalculated
+    def with_nonce(self, nonce):
+        raw = bytearray(self)
+        self.nonce_format.pack_into(raw, self.nonce_offset, nonce)
+        offset = self.hash_offset()
+        raw[offset:offset + 32] = hashlib.sha256(raw[:offset]).digest()
+        return self.from_bytes(raw)
+
+
+    # Serialize the block: header, hash, number of transactions and the encoded transactions
+    def to_bytes(self):
+        return bytes(self)
+
+
+    # Deserialize a block written by to_bytes, without recalculating its hashes
+    @classmethod
+    def from_bytes(cls, buffer):
+        return bytes.__new__(cls, buffer)
+
+
+
+############################################################################################
+################################### SMART CONTRACT Class ###################################
+############################################################################################
+# Conditions of funding and transaction contracts are compiled once, when the contract is created, into typed terms: a predicate (triggered)
+# and the payout it starts (amount paid by every party to receiver). The positional conditions list is only kept for display
+
+# Terms of a funding contract: when wallet reaches goal, then every party sends amount to receiver
+class FundingTerms(NamedTuple):
+    wallet: str
+    goal: int # Minor units of the coin (see Blockchain.scale)
+    amount: int
+    receiver: str
+    executes_once = True # The contract is finished once it paid out
+
+    # Key of the contract in the trigger index (see Blockchain.index_contract)
+    @property
+    def key(self):
+        return self.wallet
+
+    # Wallets read or paid by the contract, besides its parties
+    @property
+    def addresses(self):
+        return (self.wallet, self.receiver)
+
+    def triggered(self, wallets, transaction):
+        return self.wallet in wallets and wallets[self.wallet].balance >= self.goal
+
+
+# Terms of a transaction contract: when sender transfers total to recipient, then every party sends amount to receiver
+class TransactionTerms(NamedTuple):
+    sender: str
+    total: int # Minor units of the coin (see Blockchain.scale)
+    recipient: str
+    amount: int
+    receiver: str
+    executes_once = False # The contract pays out for every matching transfer
+
+    @property
+    def key(self):
+        return (self.sender, self.recipient, self.total)
+
+    @property
+    def addresses(self):
+        return (self.sender, self.recipient, self.receiver)
+
+    def triggered(self, wallets, transaction):
+        return transaction is not None and transaction.tag == Transfer.tag and transaction[:3] == self.key
+
+
+# Class for smart contracts, containing the contract address, contract name, conditions, contract type, compiled terms and lifecycle state
+# --> A contract is 'active' until it is 'executed' (funding contracts, once they paid out) or 'deleted'. Only active contracts are evaluated
+class smart_contract:
+    # Initialize smart contract with address, contract name, conditions, and contract type
+    def __init__(self, address=None, contract_name=None, conditions=None, contract_type=None):
+        self.address = address
+        self.contract_name = contract_name
+        self.conditions = conditions
+        self.contract_type = contract_type
+        self.terms = self.compile_conditions(conditions, contract_type)
+        self.state = "active"
+
+
+    # compiles the conditions of a funding or transaction contract into its terms (None for contracts of type 'other')
+    @staticmethod
+    def compile_conditions(conditions, contract_type):
+        try:
+            if contract_type == "funding": # ["When wallet ", wallet, " reaches ", goal, ", then send ", amount, " to ", receiver]
+                return FundingTerms(conditions[1], int(conditions[3]), int(conditions[5]), conditions[7])
+            if contract_type == "transaction": # ["When wallet ", A, " transfers ", total, " to ", B, ", then I send ", amount, " to ", receiver]
+                return TransactionTerms(conditions[1], int(conditions[3]), conditions[5], int(conditions[7]), conditions[9])
+        except (IndexError, TypeError, ValueError):
+            raise ValueError(f"Error. The conditions do not match a contract of type '{contract_type}'.")
+        return None
+
+
+    # show terms and conditions of standardized contract
+    def show_SC_terms(self):
+        # function that shows the terms and conditions of the contract
+        funding = ["When wallet [address] reaches [amount_total] then send [amount_indiv] to [receiver]"] # Standard terms for funding contracts
+        transaction = ["When wallet [address_A] transfers [amount_total] to [address_B] then I send [amount_indiv] to [receiver]"] # Standard terms for transaction contracts
+        standard_terms = [funding, transaction]
+        print(f"Standard terms for funding contracts: {funding}\n", "Standard terms for transaction contracts: {transaction}")
+
+
+    # explanation of conditions of standardized smart contract
+    def explain_conditions(self):
+        print("Depending on the type of contract, the conditions will be different. This is generally based on the type of contract.\n",
+              "The allowed contract types are: funding, transaction, other. If the selected type does not match one of these, it is automatically categoriezed as 'other'.\n",
+              "Contracts of type 'other' will not be executed automatically, but will need to be checked manually and do not have the blockchain execution.\n",
+              "If the contract is of type 'funding', the conditions will be based on the funding goal. The conditions should follow a certain pattern, precisely, based on the following:\n",
+              "'When wallet [address] reaches [amount_total] then send [amount_indiv] to [receiver]'.\n",
+              "If the contract is of type 'transaction', the conditions will be based on other transactions. The conditions should follow a certain pattern, precisely, based on the following:\n",
+              "'When wallet [address_A] transfers [amount_total] to [address_B] then I send [amount_indiv] to [receiver]'.\n",
+              "For these two types of contract, the blockchain will automatically check and execute the contract if the conditions are met.\n",
+              "If different, less restrictive conditions are needed, the contract must be of type 'other', where less restrictive conditions can be implemented.\n")
+
+
+
+############################################################################################
+##################################### Block Store Class ####################################
+############################################################################################
+# Append-only on-disk storage for the blocks of a chain, behaving like the in-memory list of blocks (len, chain[i], chain[-1], iteration, append)
+# --> Serialized blocks are appended to segment files, and a memory-mapped offset index locates every block, so blocks are only read on demand
+# --> Blocks are read with positional reads (os.pread), which do not move a shared file position: any number of threads can read blocks
+#     while one thread appends. Where os.pread is not available (Windows), reads of a segment file are serialized by a lock
+class BlockStore:
+    index_header = struct.Struct("<Q") # Number of blocks stored
+    index_record = struct.Struct("<IQI") # Segment number, offset in segment, length of the serialized block
+    index_growth = 65536 # Number of index records added whenever the index file is full
+
+    # Open (or create) the block store in the given directory; a read-only store never writes and can be opened by several processes
+    def __init__(self, path, segment_size=64 * 1024 * 1024, readonly=False):
+        self.path = path
+        self.segment_size = segment_size
+        self.readonly = readonly
+        os.makedirs(path, exist_ok=True)
+
+        # Open the offset index and map it into memory
+        index_path = os.path.join(path, "index.dat")
+        if not os.path.exists(index_path): # New store: create an empty index
+            with open(index_path, "wb") as f:
+                f.write(self.index_header.pack(0))
+                f.truncate(self.index_header.size + self.index_growth * self.index_record.size)
+        if readonly:
+            self.index_file = open(index_path, "rb")
+            self.index_map = mmap.mmap(self.index_file.fileno(), 0, access=mmap.ACCESS_READ)
+        else:
+            self.index_file = open(index_path, "r+b")
+            self.index_map = mmap.mmap(self.index_file.fileno(), 0)
+        self.length = self.index_header.unpack_from(self.index_map, 0)[0]
+
+        # Continue appending to the last segment
+        if self.length:
+            self.segment, offset, size = self.record(self.length - 1)
+        else:
+            self.segment = 0
+        self.segment_file = None if readonly else open(self.segment_path(self.segment), "ab")
+        self.readers = {} # Segment number -> file opened for reading
+        self.readers_lock = threading.Lock() # Protects the opening of readers, and the reads themselves without os.pread
+        self.last_block = (-1, None) # Cache of the last block and its index, read for every new block
+
+
+    # Path of a segment file
+    def segment_path(self, segment):
+        return os.path.join(self.path, f"segment_{segment:05d}.dat")
+
+
+    # Read an index record: segment number, offset and length of a block
+    def record(self, index):
+        return self.index_record.unpack_from(self.index_map, self.index_header.size + index * self.index_record.size)
+
+
+    # Serialize a block to bytes, using the canonical block encoding
+    def serialize(self, block):
+        return block.to_bytes()
+
+
+    # Deserialize a block from bytes
+    def deserialize(self, data):
+        return Block.from_bytes(data)
+
+
+    # Number of blocks in the store
+    def __len__(self):
+        return self.length
+
+
+    # Read a block (or a list of blocks for a slice) from disk
+    def __getitem__(self, index):
+        if isinstance(index, slice): # Slices return lists of blocks
+            return [self[i] for i in range(*index.indices(self.length))]
+        if index < 0: # Negative indexes count from the end of the chain
+            index += self.length
+        if not 0 <= index < self.length:
+            raise IndexError("Block index out of range.")
+        last_index, last_block = self.last_block
+        if index == last_index:
+            return last_block
+        segment, offset, size = self.record(index)
+        block = self.deserialize(self.read(segment, offset, size))
+        if index == self.length - 1:
+            self.last_block = (index, block)
+        return block
+
+
+    # Read size bytes at offset in a segment file
+    def read(self, segment, offset, size):
+        reader = self.readers.get(segment)
+        if reader is None:
+            with self.readers_lock:
+                reader = self.readers.get(segment)
+                if reader is None:
+                    reader = self.readers[segment] = open(self.segment_path(segment), "rb")
+        if hasattr(os, "pread"):
+            return os.pread(reader.fileno(), size, offset)
+        with self.readers_lock:
+            reader.seek(offset)
+            return reader.read(size)
+
+
+    # Iterate over all blocks, reading them one by one
+    def __iter__(self):
+        for index in range(self.length):
+            yield self[index]
+
+
+    # Iterate over all blocks in reverse order
+    def __reversed__(self):
+        for index in range(self.length - 1, -1, -1):
+            yield self[index]
+
+
+    # Append a block: write it to the current segment and record its offset in the index
+    def append(self, block):
+        if self.readonly: # Read-only stores cannot be extended
+            raise ValueError("Error. Block store is read-only.")
+        data = self.serialize(block)
+        offset = self.segment_file.tell()
+        if offset and offset + len(data) > self.segment_size: # Start a new segment when the current one is full
+            self.segment_file.close()
+            self.segment += 1
+            self.segment_file = open(self.segment_path(self.segment), "ab")
+            offset = 0
+        self.segment_file.write(data)
+        self.segment_file.flush() # Make the block visible to the readers
+
+        position = self.index_header.size + self.length * self.index_record.size
+        if position + self.index_record.size > len(self.index_map): # Grow the index file when it is full
+            self.index_map.resize(len(self.index_map) + self.index_growth * self.index_record.size)
+        self.index_record.pack_into(self.index_map, position, self.segment, offset, len(data))
+        self.length += 1
+        self.index_header.pack_into(self.index_map, 0, self.length) # The header is updated last, so a partially written block is never indexed
+        self.last_block = (self.length - 1, block)
+
+
+    # Write pending changes to disk
+    def flush(self):
+        if not self.readonly:
+            self.segment_file.flush()
+            self.index_map.flush()
+
+
+    # Close all files of the store
+    def close(self):
+        self.flush()
+        if not self.readonly:
+            self.segment_file.close()
+        for reader in self.readers.values():
+            reader.close()
+        self.readers = {}
+        self.index_map.close()
+        self.index_file.close()
+
+
+
+# Difficulty schedule of a proof of work chain: the difficulty every block must have, recomputed from the chain itself
+# --> The first mined block sets the starting difficulty, at least minimum. Every following block keeps the difficulty of the block before it,
+#     except right after each retarget_interval blocks, where the difficulty changes by the log2 of the ratio between the expected and the
+#     observed time of the last retarget_interval blocks (by at most 2 bits at once, and never below minimum)
+# --> A block carrying a lower difficulty than the schedule (e.g. a rewritten block mined at difficulty 0) is invalid, even if its hash meets it
+class DifficultyRule(NamedTuple):
+    minimum: int
+    target_block_time: float # Seconds
+    retarget_interval: int
+
+    # Whether the difficulty is retargeted right after the block at index
+    def retargets_after(self, index):
+        return index >= self.retarget_interval and not index % self.retarget_interval
+
+
+    # Retargeted difficulty, from the difficulty of the last block and the microseconds the last retarget_interval blocks took
+    def retarget(self, difficulty, elapsed):
+        observed = elapsed / 1_000_000 # Seconds
+        expected = self.target_block_time * self.retarget_interval
+        change = round(math.log2(expected / max(observed, 1e-6)))
+        return max(self.minimum, difficulty + max(-2, min(2, change)))
+
+
+    # Difficulty of the block after the block at index, from the difficulty of that block and timestamps, the timestamps of (at least)
+    # the last retarget_interval + 1 blocks up to the block at index
+    def next_difficulty(self, index, difficulty, timestamps):
+        if self.retargets_after(index):
+            return self.retarget(difficulty, timestamps[-1] - timestamps[-1 - self.retarget_interval])
+        return difficulty
+
+
+    # Whether the block at index has the difficulty of the schedule, given the difficulty of the previous block and the timestamps of
+    # (at least) the last retarget_interval + 1 blocks before it
+    def allows(self, index, difficulty, previous_difficulty, timestamps):
+        if index == 0: # Genesis block
+            return difficulty == 0
+        if index == 1: # First mined block, sets the starting difficulty
+            return difficulty >= self.minimum
+        return difficulty == self.next_difficulty(index - 1, previous_difficulty, timestamps)
+
+
+    # First block a verifier of the blocks from start on must read, to know the difficulty of the block before start and the timestamps of the retarget
+    def context_start(self, start):
+        return max(0, start - 1 - self.retarget_interval)
+
+
+
+# In-memory chain being verified in parallel, inherited by the forked worker processes so that its blocks are not serialized to them
+# (one such verification at a time, under inherited_chain_lock)
+inherited_chain = None
+inherited_chain_lock = threading.Lock()
+
+
+# Verify a range of blocks, run in a worker process by the parallel chain validation
+# source is either the path of a block store (the worker reads blocks first to stop itself) or None for the inherited in-memory chain
+# With a difficulty rule, the blocks from first to start are only read to check the difficulty schedule of the range (see DifficultyRule.context_start)
+# Returns the index of the first invalid block in the range (or None), the previous hash of the first block and the hash of the last block
+def verify_block_range(source, start, stop, rule=None):
+    first = rule.context_start(start) if rule else start
+    if isinstance(source, str): # Read the blocks from the block store
+        store = BlockStore(source, readonly=True)
+        blocks = (store[index] for index in range(first, stop))
+    else: # Read the blocks from the chain inherited from the parent process
+        store = None
+        blocks = (inherited_chain[index] for index in range(first, stop))
+
+    first_previous_hash = previous_hash = None
+    invalid_index = None
+    timestamps = collections.deque(maxlen=rule.retarget_interval + 1 if rule else 1) # Timestamps of the last blocks read
+    previous_difficulty = 0
+    for index, block in enumerate(blocks, start=first):
+        if index < start: # Context block, before the range
+            timestamps.append(block.timestamp)
+            previous_difficulty = block.difficulty
+            continue
+        if index == start: # The link to the previous range is checked by the parent process
+            first_previous_hash = block.previous_hash
+        elif block.previous_hash != previous_hash:
+            invalid_index = index
+            break
+        if block.calculate_merkle_root() != block.merkle_root or block.calculate_hash() != block.hash or not block.meets_difficulty() or \
+           (rule and not rule.allows(index, block.difficulty, previous_difficulty, timestamps)):
+            invalid_index = index
+            break
+        previous_hash = block.hash
+        timestamps.append(block.timestamp)
+        previous_difficulty = block.difficulty
+
+    if store is not None:
+        store.close()
+    return invalid_index, first_previous_hash, previous_hash
+
+
+
+############################################################################################
+####################################### Replay Engine ######################################
+############################################################################################
+# Rebuilds the wallet balances and contract parties from the blocks alone, to check them against the live ledger state
+# --> Every change of a balance is recorded on the chain: wallet creations (starting balance), transfers, contract payouts and wallet deletions
+# --> Blocks are streamed through a generator one at a time, so memory depends on the number of wallets and contracts, not on the length of the chain
+class ChainReplay:
+    def __init__(self):
+        self.balances = {} # Wallet address -> balance, in minor units
+        self.parties = {} # Contract name -> addresses that signed the contract, in signing order
+        self.payouts = {} # Contract name -> number of payouts made by the contract
+        self.height = 0 # Number of blocks replayed
+        self.transactions = 0 # Number of transactions replayed
+
+
+    # Apply the transactions of one block, decoded one after the other straight from the block's encoding
+    def apply(self, block):
+        balances = self.balances
+        offset = block.hash_offset() + 32
+        count = Block.count_format.unpack_from(block, offset)[0]
+        offset += Block.count_format.size
+        for i in range(count):
+            transaction, offset = Block.decode_transaction(block, offset)
+            tag = transaction.tag
+            if tag == Transfer.tag or tag == ContractPayout.tag: # Funds moved between two wallets
+                balances[transaction.sender] = balances.get(transaction.sender, 0) - transaction.amount
+                balances[transaction.receiver] = balances.get(transaction.receiver, 0) + transaction.amount
+                if tag == ContractPayout.tag:
+                    self.payouts[transaction.contract_name] = self.payouts.get(transaction.contract_name, 0) + 1
+            elif tag == ContractSignature.tag:
+                self.parties.setdefault(transaction.contract_name, []).append(transaction.address)
+            elif tag == WalletCreation.tag:
+                balances[transaction.address] = balances.get(transaction.address, 0) + transaction.balance
+            elif tag == WalletDeletion.tag:
+                balances[transaction.address] = balances.get(transaction.address, 0) - transaction.balance
+                if not balances[transaction.address]: # A wallet deleted with its whole balance leaves no trace
+                    del balances[transaction.address]
+        self.transactions += count
+
+
+    # Stream blocks through the replay: applies the blocks one at a time, yielding the index of every block once it is applied
+    def stream(self, blocks, start=0):
+        for index, block in enumerate(blocks, start):
+            self.apply(block)
+            self.height = index + 1
+            yield index
+
+
+    # Replay all the given blocks
+    def run(self, blocks, start=0):
+        for index in self.stream(blocks, start):
+            pass
+        return self
+
+
+    # Wallets whose replayed balance differs from the balance of the live wallets: address -> (replayed balance, live balance)
+    # None stands for a wallet missing on one side
+    def divergence(self, wallets):
+        diverged = {}
+        for address, wallet in wallets.items():
+            replayed = self.balances.get(address)
+            if replayed != wallet.balance:
+                diverged[address] = (replayed, wallet.balance)
+        for address in self.balances.keys() - wallets.keys():
+            diverged[address] = (self.balances[address], None)
+        return diverged
+
+
+
+# Block timer of a blockchain, run in a background thread (see Blockchain.start_block_timer)
+# Sleeps until the oldest pending transaction has waited interval seconds, then produces a block; stops when stop_event is set
+# or when the blockchain is garbage collected
+def run_block_timer(blockchain_ref, stop_event, interval):
+    while not stop_event.is_set():
+        blockchain = blockchain_ref()
+        if blockchain is None:
+            return
+        with blockchain.chain_lock:
+            since = blockchain.mempool_since
+        wait = interval if since is None else interval - (datetime.datetime.now() - since).total_seconds()
+        if wait <= 0:
+            try:
+                blockchain.produce_block()
+            except Exception as e: # The timer keeps running: the next transfer or the next check retries
+                print(f"Error. Pending transactions could not be sealed: {e}")
+                wait = interval
+        del blockchain # Do not keep the blockchain alive while sleeping
+        if wait > 0:
+            stop_event.wait(wait)
+
+
+
+############################################################################################
+####################################### Mining Engine ######################################
+############################################################################################
+# Proof of work: the nonce of a block is searched until the block's hash value has at least difficulty leading zero bits
+# --> Nonce ranges of chunk_size nonces are searched in parallel by a pool of worker processes. As soon as one worker finds a solution,
+#     the others are told to stop (through a shared event) and the ranges not yet started are cancelled
+# --> Hashes computed and time spent are accumulated, to report the hash rate per core
+# --> The nonces are searched in batches of 256 that differ only in the last byte of the nonce field: the hash state of the header up to that
+#     byte is computed once per batch, and every nonce of the batch only hashes its last byte and the rest of the header (precomputed)
+
+mining_stop = None # Event shared with the worker processes, set once a solution is found
+
+
+# Initialize a mining worker process with the shared stop event
+def init_mining_worker(stop_event):
+    global mining_stop
+    mining_stop = stop_event
+
+
+# Search the nonces start to stop for a block header whose hash value meets the difficulty, run in a worker process by the mining engine
+# The search position i sets the bytes of the nonce field to i in big-endian order, so consecutive positions only differ in the last byte
+# Returns the nonce found (or None) and the number of hashes computed
+def search_nonces(header, difficulty, start, stop):
+    prefix = hashlib.sha256(header[:Block.nonce_offset]) # The part of the header before the nonce is hashed only once
+    tails = [bytes([last]) + header[Block.nonce_offset + Block.nonce_format.size:] for last in range(256)] # Last nonce byte and rest of the header
+    target = (1 << (256 - difficulty)).to_bytes(32, "big") if difficulty else b"\xff" * 33 # A hash meets the difficulty if it is below target
+    for batch in range(start >> 8, (stop + 255) >> 8):
+        if not batch & 0xF and mining_stop is not None and mining_stop.is_set(): # Another worker found a solution
+            return None, max(batch << 8, start) - start
+        state = prefix.copy()
+        state.update(batch.to_bytes(7, "big")) # First 7 bytes of the nonce field
+        copy = state.copy
+        first, last = max(start - (batch << 8), 0), min(stop - (batch << 8), 256)
+        for position in range(first, last):
+            digest = copy()
+            digest.update(tails[position])
+            if digest.digest() < target:
+                position += batch << 8
+                nonce = Block.nonce_format.unpack(position.to_bytes(8, "big"))[0]
+                return nonce, position - start + 1
+    return None, stop - start
+
+
+class Miner:
+    # Initialize the mining engine with a number of worker processes (None uses all cores, 1 searches in the calling process)
+    def __init__(self, workers=None, chunk_size=1 << 16):
+        self.workers = workers or os.cpu_count() or 1
+        self.chunk_size = chunk_size # Nonces per range handed to a worker
+        self.pool = None # Worker processes, started on first use
+        self.stop_event = None
+        self.hashes = 0 # Hashes computed, over all mined blocks
+        self.seconds = 0.0 # Time spent mining
+
+
+    # Mine a block: returns the block with a nonce for which its hash value meets its difficulty
+    def mine(self, block):
+        if block.meets_difficulty(): # Instant mode, or lucky initial nonce
+            return block
+        header, difficulty = block.header_bytes(), block.difficulty
+        start_time = time.perf_counter()
+        if self.workers == 1:
+            nonce, hashes = search_nonces(header, difficulty, 0, 1 << 64)
+        else:
+            nonce, hashes = self.search_parallel(header, difficulty)
+        self.seconds += time.perf_counter() - start_time
+        self.hashes += hashes
+        if nonce is None:
+            raise ValueError("Error. No nonce found for the block.")
+        return block.with_nonce(nonce)
+
+
+    # Search nonce ranges in parallel, keeping a bounded number of ranges in flight, until one worker finds a solution
+    def search_parallel(self, header, difficulty):
+        if self.pool is None:
+            self.stop_event = multiprocessing.Event()
+            self.pool = ProcessPoolExecutor(max_workers=self.workers, initializer=init_mining_worker, initargs=(self.stop_event,))
+        self.stop_event.clear()
+        nonce, hashes, next_start = None, 0, 0
+        futures = set()
+        while nonce is None and next_start < 1 << 64:
+            while len(futures) < 2 * self.workers and next_start < 1 << 64: # Keep every worker busy
+                stop = min(next_start + self.chunk_size, 1 << 64)
+                futures.add(self.pool.submit(search_nonces, header, difficulty, next_start, stop))
+                next_start = stop
+            done, futures = wait(futures, return_when=FIRST_COMPLETED)
+            for future in done:
+                found, searched = future.result()
+                hashes += searched
+                if found is not None and nonce is None:
+                    nonce = found
+
+        self.stop_event.set() # Stop the other workers, and cancel the ranges not yet started
+        for future in futures:
+            future.cancel()
+        for future in futures:
+            if not future.cancelled():
+                hashes += future.result()[1]
+        return nonce, hashes
+
+
+    # Hash rate of the mining engine, in total and per core
+    def hash_rate(self):
+        hashes_per_second = self.hashes / self.seconds if self.seconds else 0.0
+        return {"workers": self.workers, "hashes": self.hashes, "seconds": self.seconds,
+                "hashes_per_second": hashes_per_second, "hashes_per_second_per_core": hashes_per_second / self.workers}
+
+
+    # Stop the worker processes
+    def close(self):
+        if self.pool is not None:
+            self.pool.shutdown(cancel_futures=True)
+            self.pool = None
+
+
+
+############################################################################################
+################################# Transaction Ledger Class #################################
+############################################################################################
+# Columnar copy of all transfers on the chain, kept up to date as blocks are added and used for analytics
+# --> Every column is an array (block index, position in block, sender id, receiver id, amount, timestamp), addresses are interned as integer ids
+# --> Amounts are integer minor units and are summed as integers; the DataFrames show them in coins (divided by scale once, for display)
+# --> The hash of the block holding a transfer is not stored: it is read from the chain through the block index when a table is built
+class TransactionLedger:
+    numeric_columns = ("block_index", "position", "sender", "receiver", "amount", "timestamp")
+
+    def __init__(self, scale=100):
+        self.scale = scale # Minor units per coin
+        self.block_index = array.array("q")
+        self.position = array.array("q")
+        self.sender = array.array("q")
+        self.receiver = array.array("q")
+        self.amount = array.array("q") # Minor units
+        self.timestamp = array.array("q") # Microseconds since the epoch
+        self.reference = [] # Reference (data) of each transfer
+        self.addresses = [] # Address id -> wallet address
+        self.address_ids = {} # Wallet address -> address id
+
+
+    # Number of transfers in the ledger
+    def __len__(self):
+        return len(self.amount)
+
+
+    # Return the integer id of an address, assigning a new one for addresses not seen before
+    def intern(self, address):
+        address_id = self.address_ids.get(address)
+        if address_id is None:
+            address_id = self.address_ids[address] = len(self.addresses)
+            self.addresses.append(address)
+        return address_id
+
+
+    # Append a transfer to the ledger, returns its row number
+    # The amount is appended last: a reader seeing n amounts finds at least n rows in every other column
+    def append(self, block_index, position, transaction):
+        sender, receiver, amount, data, timestamp = transaction
+        self.block_index.append(block_index)
+        self.position.append(position)
+        self.sender.append(self.intern(sender))
+        self.receiver.append(self.intern(receiver))
+        self.timestamp.append(timestamp)
+        self.reference.append(data)
+        self.amount.append(amount)
+        return len(self.amount) - 1
+
+
+    # NumPy copies of the numeric columns, for all rows or the given rows, safe to use while transfers are appended by another thread
+    # --> No view is ever kept over the arrays themselves: an array whose buffer is exported cannot grow, so the next append would fail
+    # --> All rows are copied with array slices, which do not release the GIL; given rows are read one by one
+    def columns(self, rows=None):
+        import numpy as np
+        names = self.numeric_columns
+        if rows is None:
+            length = len(self)
+            return {name: np.frombuffer(getattr(self, name)[:length], dtype=np.int64) for name in names}
+        rows = np.asarray(rows, dtype=np.int64)
+        return {name: np.fromiter(map(getattr(self, name).__getitem__, rows.tolist()), dtype=np.int64, count=len(rows)) for name in names}
+
+
+    # DataFrame of the given rows (all rows if none are given), addresses are returned as categoricals over the interned addresses
+    # block_hash returns the hash of the block at a block index; it is called once per block of the table (without it, no hash is shown)
+    def to_frame(self, rows=None, block_hash=None):
+        import numpy as np
+        import pandas as pd
+        if not len(self):
+            return pd.DataFrame()
+        columns = self.columns(rows)
+        rows = np.arange(len(columns["amount"])) if rows is None else np.asarray(rows, dtype=np.int64)
+        block_indices, inverse = np.unique(columns["block_index"], return_inverse=True)
+        hashes = np.array([block_hash(index) if block_hash else None for index in block_indices.tolist()], dtype=object)
+        references = self.reference
+        return pd.DataFrame({
+            "Block Index": columns["block_index"],
+            "Transaction Hash": hashes[inverse.reshape(-1)],
+            "Timestamp": pd.to_datetime(columns["timestamp"], unit="us"),
+            "Sender": pd.Categorical.from_codes(columns["sender"], categories=list(self.addresses)),
+            "Receiver": pd.Categorical.from_codes(columns["receiver"], categories=list(self.addresses)),
+            "Amount": columns["amount"] / self.scale,
+            "Reference": [references[row] for row in rows]})
+
+
+    # Rows appended from row start on and addresses interned from address id address_start on, saved by an incremental checkpoint
+    def delta(self, start, address_start):
+        return {name: getattr(self, name)[start:] for name in self.numeric_columns}, self.reference[start:], self.addresses[address_start:]
+
+
+    # Append rows and addresses saved by delta()
+    def extend(self, delta):
+        columns, references, addresses = delta
+        for address in addresses:
+            self.intern(address)
+        for name in self.numeric_columns:
+            getattr(self, name).extend(columns[name])
+        self.reference.extend(references)
+
+
+    # Exact integer sums of the amounts per group (e.g. per sender id), in minor units
+    @staticmethod
+    def group_sums(groups, amounts, length):
+        import numpy as np
+        sums = np.zeros(length, dtype=np.int64)
+        np.add.at(sums, groups, amounts)
+        return sums
+
+
+    # Total number of transfers, total volume and number of wallets involved
+    def totals(self):
+        amounts = self.amount[:] # Copy: the ledger may grow while the amounts are summed
+        return {"Transactions": len(amounts), "Volume": sum(amounts) / self.scale, "Wallets": len(self.addresses)}
+
+
+    # Amounts sent and received per wallet
+    def wallet_sums(self):
+        import pandas as pd
+        columns = self.columns()
+        addresses = list(self.addresses)
+        sent = self.group_sums(columns["sender"], columns["amount"], len(addresses))
+        received = self.group_sums(columns["receiver"], columns["amount"], len(addresses))
+        return pd.DataFrame({"Wallet Address": addresses, "Sent": sent / self.scale, "Received": received / self.scale,
+                             "Net": (received - sent) / self.scale})
+
+
+    # Number of transfers and volume per day
+    def volume_per_day(self):
+        import numpy as np
+        import pandas as pd
+        columns = self.columns()
+        days, day_ids = np.unique(columns["timestamp"] // 86_400_000_000, return_inverse=True) # Days since the epoch
+        return pd.DataFrame({"Date": pd.to_datetime(days, unit="D").date,
+                             "Transactions": np.bincount(day_ids, minlength=len(days)),
+                             "Volume": self.group_sums(day_ids, columns["amount"], len(days)) / self.scale})
+
+
+    # The k wallets that sent the highest amounts
+    def top_senders(self, k=10):
+        import numpy as np
+        import pandas as pd
+        columns = self.columns()
+        addresses = list(self.addresses)
+        sent = self.group_sums(columns["sender"], columns["amount"], len(addresses))
+        counts = np.bincount(columns["sender"], minlength=len(addresses))
+        top = np.argsort(-sent, kind="stable")[:k]
+        return pd.DataFrame({"Wallet Address": [addresses[i] for i in top], "Sent": sent[top] / self.scale, "Number of Transactions": counts[top]})
+
+
+
+############################################################################################
+################################# Wallet Statistics Class ##################################
+############################################################################################
+# Per-wallet statistics table, kept up to date as blocks are added (wallet creations and deletions, transfers and contract payouts)
+# --> One row per wallet, every column is an array: balance, incoming and outgoing counts and volumes, last activity and creation date
+# --> Every change updates one or two rows in O(1); the wallet overview reads the columns directly, without visiting the transactions
+class WalletStatistics:
+    columns = ("balance", "incoming", "outgoing", "volume_in", "volume_out", "last_activity", "creation_date")
+
+    def __init__(self, scale=100):
+        self.scale = scale # Minor units per coin
+        self.rows = {} # Wallet address -> row
+        self.addresses = [] # Row -> wallet address
+        self.active = array.array("b") # 0 for deleted wallets
+        for name in self.columns: # Amounts in minor units, times in microseconds since the epoch
+            setattr(self, name, array.array("q"))
+
+
+    # Number of wallets in the table (deleted wallets excluded)
+    def __len__(self):
+        return sum(self.active)
+
+
+    # Add the row of a new wallet (a deleted wallet created again starts afresh)
+    def create(self, address, balance, creation_date):
+        row = self.rows.get(address)
+        if row is None: # The row is appended to active last: a reader seeing n rows there finds them in every column
+            row = len(self.addresses)
+            for name in self.columns:
+                getattr(self, name).append(0)
+            self.addresses.append(address)
+            self.rows[address] = row
+            self.active.append(1)
+        else:
+            self.active[row] = 1
+            for name in self.columns:
+                getattr(self, name)[row] = 0
+        self.balance[row] = balance
+        self.creation_date[row] = self.last_activity[row] = creation_date
+
+
+    # Mark the row of a deleted wallet
+    def delete(self, address):
+        row = self.rows.get(address)
+        if row is not None:
+            self.active[row] = 0
+            self.balance[row] = 0
+
+
+    # Record a transfer (or contract payout) and the balances of the sender and receiver right after it
+    def record_transfer(self, sender, receiver, amount, timestamp, sender_balance, receiver_balance):
+        row = self.rows.get(sender)
+        if row is not None:
+            self.outgoing[row] += 1
+            self.volume_out[row] += amount
+            self.balance[row] = sender_balance
+            self.last_activity[row] = timestamp
+        row = self.rows.get(receiver)
+        if row is not None:
+            self.incoming[row] += 1
+            self.volume_in[row] += amount
+            self.balance[row] = receiver_balance
+            self.last_activity[row] = timestamp
+
+
+    # DataFrame of the wallets, oldest first; with top, only the top wallets by the given column, largest first
+    def to_frame(self, top=None, by="Balance"):
+        import numpy as np
+        import pandas as pd
+        # Copies of the columns (array slices, taken under the GIL): a view over the arrays would make the next wallet creation fail
+        length = len(self.active)
+        columns = {name: np.frombuffer(getattr(self, name)[:length], dtype=np.int64) for name in self.columns}
+        incoming, outgoing = columns["incoming"], columns["outgoing"]
+        sort_keys = {"Balance": columns["balance"], "Number of Transactions": incoming + outgoing, "Incoming Transactions": incoming,
+                     "Outgoing Transactions": outgoing, "Volume In": columns["volume_in"], "Volume Out": columns["volume_out"],
+                     "Last Activity": columns["last_activity"], "Creation Date": columns["creation_date"]}
+        if by not in sort_keys:
+            raise ValueError(f"Error. Cannot sort wallets by '{by}'.")
+        rows = np.flatnonzero(np.frombuffer(self.active[:length], dtype=np.int8))
+        if top is not None: # Partial selection of the top rows, then sort of these rows only
+            keys = sort_keys[by][rows]
+            if top < len(rows):
+                selected = np.argpartition(-keys, top - 1)[:top]
+                rows, keys = rows[selected], keys[selected]
+            rows = rows[np.argsort(-keys, kind="stable")]
+        else: # Sort by Creation Date in ascending order to have the oldest wallets at the top
+            rows = rows[np.argsort(columns["creation_date"][rows], kind="stable")]
+        return pd.DataFrame({
+            "#": np.arange(1, len(rows) + 1),
+            "Wallet Address": [self.addresses[row] for row in rows],
+            "Balance": columns["balance"][rows] / self.scale,
+            "Number of Transactions": incoming[rows] + outgoing[rows],
+            "Incoming Transactions": incoming[rows],
+            "Outgoing Transactions": outgoing[rows],
+            "Volume In": columns["volume_in"][rows] / self.scale,
+            "Volume Out": columns["volume_out"][rows] / self.scale,
+            "Last Activity": pd.to_datetime(columns["last_activity"][rows], unit="us"),
+            "Creation Date": pd.to_datetime(columns["creation_date"][rows], unit="us")})
+
+
+
+############################################################################################
+##################################### Blockchain Class #####################################
+############################################################################################
+# Will only be initialized once and will be updated as new blocks are added
+class Blockchain:
+    chain_numbers = itertools.count(1) # Numbers the blockchains created in the process, for the labels of their gauges
+
+    # Creates the first ("genesis") block, a dictionary of registered wallets, a list of transactions, and data storage for smart contracts
+    # With batching enabled, transfers and contract signatures are collected in a pending transaction pool (mempool) and
+    # packed into blocks of up to max_block_transactions transactions, or max_block_interval milliseconds of traffic
+    # With a store_path, blocks are kept in an on-disk block store and the ledger state is reloaded from the store when it already exists
+    # Amounts are kept as integers in minor units: scale is the number of minor units per coin (100 by default, i.e. amounts have two decimals)
+    # Amounts passed to and returned by the public functions are in coins; they are converted once, with to_units and to_coins
+    # With proof_of_work, every new block is mined at the current difficulty (leading zero bits of its hash) by mining_workers processes,
+    # and the difficulty is retargeted every retarget_interval blocks so that blocks take target_block_time seconds on average, never going
+    # below min_difficulty (the chain validation rejects blocks below the difficulty schedule, see DifficultyRule).
+    # Without it (instant mode, the default), blocks are sealed immediately with difficulty 0
+    # With quiet, the messages confirming the operations (transfers, wallets, contracts) are not printed, e.g. for a blockchain served to clients
+    def __init__(self, batching=False, max_block_transactions=100, max_block_interval=1000, store_path=None, scale=100,
+                 proof_of_work=False, difficulty=16, target_block_time=1.0, retarget_interval=10, mining_workers=None,
+                 checkpoint_interval=10000, checkpoints_kept=2, min_difficulty=1, quiet=False):
+        self.quiet = quiet
+        self.store_path = store_path
+        self.checkpoint_interval = checkpoint_interval # Blocks between two state checkpoints of a persistent chain (0 only checkpoints on close)
+        self.checkpoints_kept = checkpoints_kept # Number of most recent checkpoint files kept in the block store
+        self.checkpoint_height = 0 # Chain length covered by the last checkpoint written or loaded
+        self.journal_file = None # Registry journal of a persistent chain, see journal()
+        self.history_file = None # History log of a persistent chain, see save_history()
+        self.history_offset = 0 # Length of the history log covered by the last checkpoint written or loaded
+        self.history_rows = self.history_addresses = 0 # Ledger rows and addresses covered by the last checkpoint written or loaded
+        self.scale = scale
+        self.proof_of_work = proof_of_work
+        if proof_of_work and difficulty < min_difficulty:
+            raise ValueError("Error. The difficulty must be at least the minimum difficulty.")
+        self.difficulty = difficulty if proof_of_work else 0 # Leading zero bits required from the hash of the next block
+        self.target_block_time = target_block_time
+        self.retarget_interval = retarget_interval
+        self.difficulty_rule = DifficultyRule(min_difficulty, target_block_time, retarget_interval) if proof_of_work else None
+        self.miner = Miner(mining_workers) if proof_of_work else None
+        if store_path: # Persistent chain, read from disk on demand
+            self.chain = BlockStore(store_path)
+            if not len(self.chain): # New store: start with the genesis block
+                self.chain.append(self.create_genesis_block())
+        else: # Chain held in memory
+            self.chain = [self.create_genesis_block()]
+        if proof_of_work and self.chain[-1].difficulty: # Continue at the difficulty of the stored chain (retargeted if its last block ends an interval)
+            self.difficulty = self.chain[-1].difficulty
+            self.retarget()
+        self.wallets = {}
+        self.SC = {} # Contract registry: contract name -> smart_contract (with its compiled terms and lifecycle state)
+        self.contract_parties = {}
+        self.starting_balance = self.to_units(100) # Balance of new wallets, in minor units
+        self.ledger = TransactionLedger(scale) # Columnar ledger of all transfers
+        self.wallet_stats = WalletStatistics(scale) # Per-wallet statistics table, read by the wallet overview
+        self.wallet_index = {} # Per-wallet index: wallet address -> (ledger rows, balances after transfer in minor units) arrays
+        self.SCfunding_index = {} # Trigger index for funding contracts: watched wallet address -> list of contract names
+        self.SCtransaction_index = {} # Trigger index for transaction contracts: (sender, receiver, amount) -> list of contract names
+        self.contract_blocks = {} # Per-contract index: contract name -> heights of the blocks holding its signatures and payouts (array)
+        self.diagram_fragments = {} # Chain diagram cache: block height -> (block hash, DOT node, DOT edge to the previous block)
+        self.batching = batching
+        self.max_block_transactions = max_block_transactions
+        self.max_block_interval = max_block_interval
+        self.mempool = [] # Pending transactions waiting to be packed into a block
+        self.mempool_since = None # Time at which the oldest pending transaction was submitted
+        self.pending_debits = {} # Wallet address -> sum of the amounts (minor units) of its pending outgoing transfers
+        self.block_timer = None # Thread producing a block when the oldest pending transaction waited max_block_interval, see start_block_timer()
+        self.block_timer_stop = threading.Event()
+        # Locks making the ledger safe to use from several threads. They are always taken in this order, so threads never wait on each other:
+        # contract lock -> wallet locks (sorted by address, see wallet_locks) -> chain lock
+        self.contract_lock = threading.RLock() # Held while smart contracts are registered, evaluated or deleted
+        self.chain_lock = threading.RLock() # Held while a block is appended to the chain and indexed, and while the pending transaction pool changes
+        if store_path:
+            self.load_state() # Reload wallets, contracts and indexes from the latest checkpoint, and replay the blocks after it
+            self.journal_file = open(os.path.join(store_path, "registry.log"), "ab")
+            self.history_file = open(os.path.join(store_path, "history.log"), "ab")
+            if self.mempool: # Transactions pending at the checkpoint still get their block in time
+                self.start_block_timer()
+        if metrics.enabled:
+            self.register_metrics()
+
+
+    # Export the sizes of the chain, the wallets, the active contracts and the pending transaction pool as gauges, labelled with the number
+    # of the blockchain in the process and its block store path (empty for in-memory chains), so that every live blockchain has its own series
+    # The gauges only hold a weak reference, so they do not keep the blockchain alive, and are removed when the blockchain is garbage collected
+    def register_metrics(self):
+        blockchain = weakref.ref(self)
+        labels = (("chain", str(next(Blockchain.chain_numbers))), ("store", self.store_path or ""))
+        def size(function):
+            return lambda: function(blockchain()) if blockchain() is not None else None
+        metrics.gauge("macoin_chain_blocks", "Number of blocks in the chain", size(lambda self: len(self.chain)), labels)
+        metrics.gauge("macoin_wallets", "Number of registered wallets", size(lambda self: len(self.wallets)), labels)
+        metrics.gauge("macoin_active_contracts", "Number of active smart contracts",
+                      size(lambda self: sum(map(len, self.SCfunding_index.values())) + sum(map(len, self.SCtransaction_index.values()))), labels)
+        metrics.gauge("macoin_pending_transactions", "Number of transactions in the pending transaction pool", size(lambda self: len(self.mempool)), labels)
+        weakref.finalize(self, metrics.remove, labels)
+
+
+    # Print a message confirming an operation, unless the blockchain is quiet
+    def notify(self, message):
+        if not self.quiet:
+            print(message)
+
+
+    ###################
+    ### CHECKPOINTS ###
+    ###################
+    # The ledger state of a persistent chain is saved in checkpoint files next to the block store, every checkpoint_interval blocks and on close
+    # --> A checkpoint is tied to a chain length (height) and the hash of the last block it covers. On startup, the latest checkpoint matching
+    #     the stored chain is loaded and only the blocks after it are replayed, so restarting does not depend on the length of the chain
+    # --> Changes of the wallet and contract registry that are not recorded in blocks (wallet passwords and recovery phrases, contract conditions,
+    #     deleted contracts) are appended to a registry journal, and replayed in order with the blocks
+    # --> Checkpoints are incremental: the indexes that only grow with the history (the columnar ledger, the per-wallet and per-contract indexes)
+    #     are appended to a history log, one delta per checkpoint with what was added since the previous one. A checkpoint file only holds the
+    #     state that depends on the number of wallets and contracts, and the length of the history log it covers
+    checkpoint_header = struct.Struct("<8sQ32sQQ") # Magic, height, hash of the last block covered, length of the registry journal and of the history log covered
+    checkpoint_magic = b"MACCKPT3"
+
+    # Ledger state saved in checkpoint files, besides the wallets (the history indexes are saved in the history log)
+    state_attributes = ("scale", "SC", "contract_parties", "starting_balance", "wallet_stats", "SCfunding_index", "SCtransaction_index",
+                        "mempool", "mempool_since", "pending_debits")
+
+
+    # Path of the checkpoint covering the first height blocks
+    def checkpoint_path(self, height):
+        return os.path.join(self.store_path, f"checkpoint_{height:012d}.dat")
+
+
+    # Append a change of the wallet and contract registry to the registry journal, together with the chain length it happened at
+    def journal(self, kind, *fields):
+        if self.journal_file is None: # In-memory chain, or state being loaded
+            return
+        with self.chain_lock: # Orders the change among the blocks
+            pickle.dump((kind, len(self.chain)) + fields, self.journal_file, protocol=pickle.HIGHEST_PROTOCOL)
+            self.journal_file.flush()
+
+
+    # Append many changes of the same kind to the registry journal at once (one tuple of fields per change), flushed once
+    def journal_many(self, kind, changes):
+        if self.journal_file is None:
+            return
+        with self.chain_lock:
+            height = len(self.chain)
+            for fields in changes:
+                pickle.dump((kind, height) + fields, self.journal_file, protocol=pickle.HIGHEST_PROTOCOL)
+            self.journal_file.flush()
+
+
+    # Read the registry journal from the given offset, one change at a time (a change left incomplete by a crash ends the journal)
+    def read_journal(self, offset):
+        journal_path = os.path.join(self.store_path, "registry.log")
+        if not os.path.exists(journal_path):
+            return
+        with open(journal_path, "rb") as f:
+            f.seek(offset)
+            while True:
+                try:
+                    yield pickle.load(f)
+                except (EOFError, pickle.UnpicklingError):
+                    return
+
+
+    # Apply a change read from the registry journal
+    def apply_journal(self, change):
+        kind, height, *fields = change
+        if kind == "wallet": # New wallet: address, password, recovery phrase, creation date (the starting balance is replayed from the blocks)
+            address, password, phrase, creation_date = fields
+            address = sys.intern(address)
+            self.wallets[address] = Wallet(address, password, phrase, creation_date)
+        elif kind == "password": # New password: address, password
+            address, password = fields
+            if address in self.wallets:
+                self.wallets[address].password = password
+        elif kind == "contract": # New contract: name, creator, conditions, type (the signatures are replayed from the blocks)
+            contract_name, address, conditions, contract_type = fields
+            self.SC[contract_name] = smart_contract(address, contract_name, conditions, contract_type)
+            self.index_contract(self.SC[contract_name])
+        elif kind == "delete_contract": # Finished contract: name, and state ('deleted' if not recorded)
+            contract_name, *state = fields
+            if contract_name in self.SC:
+                self.finish_contract(contract_name, *state)
+
+
+    # Append to the history log what the history indexes gained since the last checkpoint, returns the length of the log
+    # --> Ledger rows and addresses after the ones already saved; the rows of every wallet from the first ledger row not yet saved
+    #     (rows of a wallet are increasing), and the block heights of every contract from the first block not yet saved
+    # --> A delta appended by a checkpoint that was never completed is dropped first, so the log only holds the deltas of written checkpoints
+    def save_history(self):
+        self.history_file.truncate(self.history_offset)
+        wallet_rows = {}
+        for address, (rows, balances_after_transfer) in self.wallet_index.items():
+            start = bisect.bisect_left(rows, self.history_rows)
+            if start < len(rows):
+                wallet_rows[address] = (rows[start:], balances_after_transfer[start:])
+        contract_heights = {}
+        for contract_name, heights in self.contract_blocks.items():
+            start = bisect.bisect_left(heights, self.checkpoint_height)
+            if start < len(heights):
+                contract_heights[contract_name] = heights[start:]
+        delta = (self.ledger.delta(self.history_rows, self.history_addresses), wallet_rows, contract_heights)
+        pickle.dump(delta, self.history_file, protocol=pickle.HIGHEST_PROTOCOL)
+        self.history_file.flush()
+        return self.history_file.tell()
+
+
+    # Read the history log up to the given length, appending every delta to the (empty) history indexes
+    def load_history(self, length):
+        with open(os.path.join(self.store_path, "history.log"), "rb") as f:
+            while f.tell() < length:
+                ledger_delta, wallet_rows, contract_heights = pickle.load(f)
+                self.ledger.extend(ledger_delta)
+                for address, (rows, balances_after_transfer) in wallet_rows.items():
+                    indexed_rows, indexed_balances = self.wallet_index.setdefault(address, (array.array("q"), array.array("q")))
+                    indexed_rows.extend(rows)
+                    indexed_balances.extend(balances_after_transfer)
+                for contract_name, heights in contract_heights.items():
+                    self.contract_blocks.setdefault(contract_name, array.array("q")).extend(heights)
+
+
+    # Write a checkpoint of the ledger state at the current chain length, and remove the oldest checkpoints
+    # Every lock is held, so no transfer is half applied and no block is added while the state is written; the history indexes only
+    # contribute what they gained since the last checkpoint
+    @metrics.timed("save_state")
+    def save_state(self):
+        if not self.store_path: # Only persistent chains have checkpoints
+            raise ValueError("Error. Blockchain has no block store.")
+        with self.contract_lock, self.wallet_locks(*self.wallets), self.chain_lock:
+            self.chain.flush()
+            self.journal_file.flush()
+            height = len(self.chain)
+            history_offset = self.save_history()
+            header = self.checkpoint_header.pack(self.checkpoint_magic, height, bytes.fromhex(self.chain[-1].hash), self.journal_file.tell(), history_offset)
+            wallets = list(self.wallets.values())
+            state = {name: getattr(self, name) for name in self.state_attributes}
+            # Wallets are saved column by column: one list or array per attribute instead of one pickled object per wallet
+            state["wallets"] = ([wallet.address for wallet in wallets], array.array("q", [wallet.balance for wallet in wallets]),
+                                [wallet.password for wallet in wallets], [wallet.phrase for wallet in wallets],
+                                array.array("q", [Block.encode_timestamp(wallet.creation_date) for wallet in wallets]))
+            checkpoint_path = self.checkpoint_path(height)
+            with open(checkpoint_path + ".tmp", "wb") as f: # Write to a temporary file first, so a crash never leaves a partial checkpoint
+                f.write(header)
+                pickle.dump(state, f, protocol=pickle.HIGHEST_PROTOCOL)
+            os.replace(checkpoint_path + ".tmp", checkpoint_path)
+            self.checkpoint_height = height
+            self.history_offset, self.history_rows, self.history_addresses = history_offset, len(self.ledger), len(self.ledger.addresses)
+
+        for height in self.checkpoint_heights()[self.checkpoints_kept:]: # Keep the most recent checkpoints only
+            os.remove(self.checkpoint_path(height))
+
+
+    # Write a checkpoint if checkpoint_interval blocks were added since the last one, called once the caller released its locks
+    def maybe_save_state(self):
+        if self.journal_file is not None and self.checkpoint_interval and len(self.chain) - self.checkpoint_height >= self.checkpoint_interval:
+            self.save_state()
+
+
+    # Heights of the checkpoints in the block store, most recent first
+    def checkpoint_heights(self):
+        names = (name for name in os.listdir(self.store_path) if name.startswith("checkpoint_") and name.endswith(".dat"))
+        return sorted((int(name[len("checkpoint_"):-len(".dat")]) for name in names), reverse=True)
+
+
+    # Load the latest checkpoint matching the stored chain (if any), then replay the blocks after it together with the registry journal
+    def load_state(self):
+        height, offset = 1, 0 # Without checkpoint, the whole chain is replayed after the genesis block
+        for checkpoint_height in self.checkpoint_heights():
+            with open(self.checkpoint_path(checkpoint_height), "rb") as f:
+                header = f.read(self.checkpoint_header.size)
+                if len(header) < self.checkpoint_header.size or header[:8] != self.checkpoint_magic:
+                    print(f"Warning. Checkpoint at block {checkpoint_height} has another format, skipped.")
+                    continue
+                magic, checkpoint_height, block_hash, journal_offset, history_offset = self.checkpoint_header.unpack(header)
+                if magic != self.checkpoint_magic or checkpoint_height > len(self.chain) or bytes.fromhex(self.chain[checkpoint_height - 1].hash) != block_hash:
+                    print(f"Warning. Checkpoint at block {checkpoint_height} does not match the chain, skipped.")
+                    continue
+                state = pickle.load(f)
+            if state["scale"] != self.scale: # Amounts were saved in other minor units
+                raise ValueError(f"Error. Saved state uses scale {state['scale']}, not {self.scale}.")
+            for name in self.state_attributes:
+                setattr(self, name, state[name])
+            addresses, balances, passwords, phrases, creation_dates = state["wallets"]
+            self.wallets = {sys.intern(address): Wallet(sys.intern(address), password, phrase, Block.decode_timestamp(creation_date), balance)
+                            for address, balance, password, phrase, creation_date in zip(addresses, balances, passwords, phrases, creation_dates)}
+            self.load_history(history_offset)
+            self.history_offset, self.history_rows, self.history_addresses = history_offset, len(self.ledger), len(self.ledger.addresses)
+            height, offset = checkpoint_height, journal_offset
+            break
+        self.checkpoint_height = height
+
+        # Replay the blocks added after the checkpoint, applying every registry change before the first block added after it
+        pending = {} # Transactions pending at the checkpoint -> count: their signatures were already applied, their transfers not yet
+        for transaction in self.mempool:
+            pending[transaction] = pending.get(transaction, 0) + 1
+        changes = self.read_journal(offset)
+        change = next(changes, None)
+        with open(os.devnull, "w") as devnull, contextlib.redirect_stdout(devnull): # The smart contracts print a message for every payout
+            for block_index in range(height, len(self.chain)):
+                while change is not None and change[1] <= block_index:
+                    self.apply_journal(change)
+                    change = next(changes, None)
+                self.replay_block(block_index, self.chain[block_index], pending)
+            while change is not None: # Changes after the last block
+                self.apply_journal(change)
+                change = next(changes, None)
+
+
+    # Apply a block added after the loaded checkpoint: move the funds of its transfers and contract payouts, sign its contracts,
+    # create and delete its wallets, and index it. The smart contracts are not executed again, their payouts being recorded in the blocks
+    # Transactions pending at the checkpoint are taken off the pending transaction pool
+    def replay_block(self, block_index, block, pending):
+        transactions = block.transactions
+        balances = []
+        for transaction in transactions:
+            was_pending = pending.get(transaction, 0) > 0
+            if was_pending:
+                pending[transaction] -= 1
+                self.mempool.remove(transaction)
+                if not self.mempool:
+                    self.mempool_since = None
+            if transaction.tag in (Transfer.tag, ContractPayout.tag):
+                sender, receiver, amount = transaction.sender, transaction.receiver, transaction.amount
+                if was_pending: # Release the reserved amount
+                    self.pending_debits[sender] -= amount
+                    if not self.pending_debits[sender]:
+                        del self.pending_debits[sender]
+                if sender in self.wallets:
+                    self.wallets[sender].balance -= amount
+                if receiver in self.wallets:
+                    self.wallets[receiver].balance += amount
+                balances.append({address: self.wallets[address].balance if address in self.wallets else 0 for address in (sender, receiver)})
+                continue
+            if transaction.tag == ContractSignature.tag:
+                if not was_pending: # Signatures pending at the checkpoint were already added to the parties
+                    self.contract_parties.setdefault(transaction.contract_name, []).append(transaction.address)
+            elif transaction.tag == WalletCreation.tag:
+                if transaction.address in self.wallets: # Registered by the registry journal
+                    self.wallets[transaction.address].balance += transaction.balance
+            elif transaction.tag == WalletDeletion.tag:
+                self.wallets.pop(transaction.address, None)
+            balances.append({})
+        for position, transaction in enumerate(transactions):
+            self.index_transaction(transaction, block_index, position, balances[position])
+
+
+    # Replay the whole chain with the replay engine, and report where the live ledger state diverges from it
+    # The live balances and parties are copied while every lock is held, then the chain up to that point is replayed without blocking the ledger
+    # Returns the number of blocks replayed and the diverging balances (address -> (replayed, live)) and contract parties (name -> (replayed, live))
+    def check_state(self):
+        with self.contract_lock, self.wallet_locks(*self.wallets), self.chain_lock:
+            height = len(self.chain)
+            wallets = {address: Wallet(address, None, None, None, wallet.balance) for address, wallet in self.wallets.items()}
+            parties = {contract_name: list(addresses) for contract_name, addresses in self.contract_parties.items()}
+            for transaction in self.mempool: # Pending signatures are already counted in the live parties, not yet on the chain
+                if transaction.tag == ContractSignature.tag:
+                    parties[transaction.contract_name].remove(transaction.address)
+        replay = ChainReplay().run(self.chain[index] for index in range(height))
+        diverged_parties = {}
+        for contract_name in replay.parties.keys() | {contract_name for contract_name, addresses in parties.items() if addresses}:
+            if replay.parties.get(contract_name, []) != parties.get(contract_name, []):
+                diverged_parties[contract_name] = (replay.parties.get(contract_name, []), parties.get(contract_name, []))
+        return {"blocks": replay.height, "transactions": replay.transactions, "balances": replay.divergence(wallets), "parties": diverged_parties}
+
+
+    # Stop the block timer, save the ledger state, close the block store and stop the mining workers
+    def close(self):
+        self.block_timer_stop.set()
+        if self.block_timer is not None:
+            self.block_timer.join()
+        if self.store_path:
+            self.save_state()
+            self.chain.close()
+            self.journal_file.close()
+            self.history_file.close()
+        if self.miner is not None:
+            self.miner.close()
+
+
+    # Convert an amount of coins (int, float, string or Decimal) into integer minor units
+    # Amounts finer than one minor unit are rejected rather than rounded, so no coin is ever created or lost by a conversion
+    def to_units(self, amount):
+        try:
+            units = decimal.Decimal(str(amount)) * self.scale
+        except decimal.InvalidOperation:
+            raise ValueError("Amount must be a number.")
+        if not units.is_finite():
+            raise ValueError("Amount must be a number.")
+        if units != units.to_integral_value():
+            raise ValueError(f"Amount must be a multiple of {decimal.Decimal(1) / self.scale:f}.")
+        return int(units)
+
+
+    # Convert integer minor units into coins, for display
+    def to_coins(self, units):
+        return units / self.scale
+
+
+    # Total supply of coins held by the wallets, as an exact integer number of minor units
+    def total_supply(self):
+        return sum(wallet.balance for wallet in list(self.wallets.values()))
+
+
+    # Lock the wallets of the given addresses, in sorted order: transfers between disjoint wallets run concurrently, and two transfers
+    # sharing wallets always lock them in the same order, so they cannot deadlock. Addresses that are not wallets are ignored
+    # Smart contracts must not be evaluated while wallet locks are held (the contract lock comes first)
+    @contextlib.contextmanager
+    def wallet_locks(self, *addresses):
+        with contextlib.ExitStack() as stack:
+            for address in sorted(set(addresses)):
+                wallet = self.wallets.get(address)
+                if wallet is not None:
+                    stack.enter_context(wallet.lock)
+            yield
+
+
+    # Create the first block in the chain, with a hash value =0
+    def create_genesis_block(self):
+        return Block(Block.now(), "Genesis Block", "0")
+
+
+    # Verify the integrity of the whole chain: streams through the blocks, checking every previous hash link, Merkle root, recalculated hash and proof of work
+    # The proof of work of a proof of work chain is checked against the difficulty schedule recomputed from the chain, not only the difficulty each block carries
+    # With several workers, the chain is split into ranges of chunk_size blocks which are verified in parallel by worker processes (workers=None uses all cores)
+    # Chains shorter than parallel_min_blocks are verified here, where starting the workers would cost more than it saves, and so are in-memory
+    # chains where worker processes cannot be forked (they would need every block serialized to them). Workers are capped at the number of cores
+    # Returns the index of the first invalid block, or None if the chain is valid
+    @metrics.timed("verify_chain")
+    def verify_chain(self, workers=1, chunk_size=50000, parallel_min_blocks=100000):
+        workers = min(workers or os.cpu_count() or 1, os.cpu_count() or 1)
+        forkable = self.store_path or "fork" in multiprocessing.get_all_start_methods()
+        if workers > 1 and len(self.chain) > chunk_size and len(self.chain) >= parallel_min_blocks and forkable:
+            return self.verify_chain_parallel(workers, chunk_size)
+
+        rule = self.difficulty_rule
+        previous_hash = "0" # The genesis block links to hash value 0
+        timestamps = collections.deque(maxlen=rule.retarget_interval + 1 if rule else 1) # Timestamps of the last blocks, for the retargets
+        previous_difficulty = 0
+        for index, block in enumerate(self.chain):
+            if block.previous_hash != previous_hash or block.calculate_merkle_root() != block.merkle_root or block.calculate_hash() != block.hash or not block.meets_difficulty():
+                return index
+            if rule and not rule.allows(index, block.difficulty, previous_difficulty, timestamps):
+                return index
+            previous_hash = block.hash
+            timestamps.append(block.timestamp)
+            previous_difficulty = block.difficulty
+        return None
+
+
+    # Parallel chain validation: worker processes recompute the hashes of their range, and the links between the ranges are stitched together here
+    def verify_chain_parallel(self, workers, chunk_size):
+        if self.store_path: # Workers read their range directly from the block store
+            self.chain.flush()
+            return self.verify_ranges(workers, chunk_size, self.store_path, None)
+        global inherited_chain
+        with inherited_chain_lock: # Workers are forked with the chain (blocks are immutable, and appended blocks are beyond the verified length)
+            inherited_chain = self.chain
+            try:
+                return self.verify_ranges(workers, chunk_size, None, multiprocessing.get_context("fork"))
+            finally:
+                inherited_chain = None
+
+
+    # Verify the chain in ranges of chunk_size blocks read from source (see verify_block_range) by worker processes started in the given context
+    def verify_ranges(self, workers, chunk_size, source, context):
+        rule = self.difficulty_rule
+        length = len(self.chain)
+        ranges = [(start, min(start + chunk_size, length)) for start in range(0, length, chunk_size)]
+        submit = lambda pool, start, stop: pool.submit(verify_block_range, source, start, stop, rule)
+
+        with ProcessPoolExecutor(max_workers=workers, mp_context=context) as pool:
+            futures = []
+            next_range = 0
+            previous_hash = "0" # The genesis block links to hash value 0
+            for position, (start, stop) in enumerate(ranges):
+                while next_range < len(ranges) and next_range < position + 2 * workers: # Keep a bounded number of ranges in flight
+                    futures.append(submit(pool, *ranges[next_range]))
+                    next_range += 1
+                invalid_index, first_previous_hash, last_hash = futures[position].result()
+                if first_previous_hash != previous_hash: # The range does not link to the end of the previous range
+                    invalid_index = start
+                if invalid_index is not None: # Stop at the first invalid block, cancelling the ranges not yet started
+                    for future in futures:
+                        future.cancel()
+                    return invalid_index
+                previous_hash = last_hash
+        return None
+
+
+    # Function to authenticate user
+    def authenticate_user(self, address=None, password=None):
+        # Check if address and password are provided, otherwise prompt user for input
+        if not address: # If address is not provided, ask user for address
+            for i in range(3):
+                address = input("Enter your wallet address: ")
+                if address in self.wallets: # Check if wallet exists
+                    if password != None and self.wallets[address].password == password: # Check if password is correct if a password is provided
+                        return True
+                    break
+                else:
+                    print("Erro. Wallet not found.") # Return error if wallet provided was not found, and prompt user to try again
+
+        # checks if password is provided otherwise asks user for password and checks if password is correct
+        if not password: # If password is not provided, ask user for password
+            for i in range(3):
+                password = input("Enter the password for your wallet: ")
+                if self.wallets[address].password == password: # Check if password is correct
+                    return True
+                else:
+                    print("Error. Incorrect password.") # Return error if password provided was incorrect, and prompt user to try again
+
+        # checks if address and password are provided and checks if wallet exists and password is correct
+        if address in self.wallets and self.wallets[address].password == password:
+            return True
+
+        # if none of the above conditions are met, raises an error
+        else:
+            raise ValueError("Error. Wallet not found or incorrect password.")       
+
+
+    # Add a new block to the chain, including timestamp, data, transaction, and previous block's hash
+    def add_block(self, transaction, data=None):
+        self.add_block_transactions([transaction], data)
+
+
+    # Add a new block holding several transactions to the chain
+    # data=None sets the block data to the block number, determined while the chain is locked
+    # balances optionally holds, per transaction, the balances of the wallets involved right after that transaction was applied
+    # with execute_contracts=False, the caller evaluates the smart contracts itself (e.g. once for a whole batch of transfers, or after releasing its wallet locks)
+    def add_block_transactions(self, transactions, data=None, balances=None, execute_contracts=True):
+        start = time.perf_counter()
+        with self.chain_lock: # Appends are serialized, so every block links to the block appended just before it
+            if data is None:
+                data = f"Block {len(self.chain)}" # Block data is the block number
+            previous_block = self.chain[-1]
+            sealing_start = time.perf_counter()
+            new_block = Block(Block.now(), data, previous_block.hash, transactions, difficulty=self.difficulty)
+            if self.proof_of_work: # Search a nonce for which the block's hash meets the difficulty
+                new_block = self.miner.mine(new_block)
+            if metrics.enabled:
+                block_sealing.observe(time.perf_counter() - sealing_start)
+            self.chain.append(new_block)
+            block_index = len(self.chain) - 1
+            if self.proof_of_work:
+                self.retarget()
+            for position, transaction in enumerate(transactions): # Record the transfers in the ledger and the per-wallet index
+                self.index_transaction(transaction, block_index, position, balances[position] if balances else None)
+        if execute_contracts:
+            for transaction in new_block.transactions: # Automatically execute the smart contracts each transaction of the new block can affect
+                self.execute_contract(self.triggered_contracts(transaction), transaction)
+            self.maybe_save_state()
+        if metrics.enabled:
+            add_block_duration.observe(time.perf_counter() - start)
+
+
+    # Difficulty retargeting after the last block, when it ends a retarget interval: every bit of difficulty doubles the expected mining work,
+    # so the difficulty changes by the log2 of the ratio between the expected and the observed time of the interval (see DifficultyRule)
+    def retarget(self):
+        index = len(self.chain) - 1
+        if self.difficulty_rule.retargets_after(index):
+            elapsed = self.chain[index].timestamp - self.chain[index - self.retarget_interval].timestamp
+            self.difficulty = self.difficulty_rule.retarget(self.difficulty, elapsed)
+
+
+    # Record a transfer in the columnar ledger, and its ledger row in the per-wallet index together with the balances right after the transfer
+    # Contract payouts are recorded as transfers referenced by the name of the contract
+    # The blocks holding contract signatures and payouts are recorded in the per-contract index, and every change of a wallet in the wallet statistics
+    def index_transaction(self, transaction, block_index, position, balances):
+        if transaction and transaction.tag in (ContractSignature.tag, ContractPayout.tag):
+            heights = self.contract_blocks.setdefault(transaction.contract_name, array.array("q"))
+            if not heights or heights[-1] != block_index: # A block is recorded once, whatever the number of its transactions for the contract
+                heights.append(block_index)
+        elif transaction and transaction.tag == WalletCreation.tag:
+            wallet = self.wallets.get(transaction.address)
+            creation_date = Block.encode_timestamp(wallet.creation_date) if wallet is not None and wallet.creation_date else transaction.timestamp
+            self.wallet_stats.create(transaction.address, transaction.balance, creation_date)
+        elif transaction and transaction.tag == WalletDeletion.tag:
+            self.wallet_stats.delete(transaction.address)
+        if not transaction or transaction.tag not in (Transfer.tag, ContractPayout.tag): # Skip if the block contains no transfer of funds
+            return
+        if transaction.tag == ContractPayout.tag:
+            transaction = Transfer(transaction.sender, transaction.receiver, transaction.amount, transaction.contract_name, transaction.timestamp)
+        row = self.ledger.append(block_index, position, transaction)
+        balances_after = []
+        for address in transaction[:2]: # Sender and receiver of the transfer
+            if balances is not None: # Balance recorded when the transaction was applied
+                balance_after_transfer = balances[address]
+            else: # Balance right now, the transaction having just been applied
+                balance_after_transfer = self.wallets[address].balance if address in self.wallets else 0 # Deleted wallets hold nothing
+            if address not in self.wallet_index:
+                self.wallet_index[address] = (array.array("q"), array.array("q"))
+            rows, balances_after_transfer = self.wallet_index[address]
+            rows.append(row)
+            balances_after_transfer.append(balance_after_transfer)
+            balances_after.append(balance_after_transfer)
+        self.wallet_stats.record_transfer(transaction.sender, transaction.receiver, transaction.amount, transaction.timestamp, *balances_after)
+
+
+    # Write transactions already applied to the balances to a bounded number of blocks, of up to max_block_transactions transactions each
+    def write_blocks(self, transactions, balances):
+        for start in range(0, len(transactions), self.max_block_transactions):
+            stop = start + self.max_block_transactions
+            self.add_block_transactions(transactions[start:stop], None, balances[start:stop], execute_contracts=False)
+
+
+    # Start the block timer, if not running: a background thread producing a block as soon as the oldest pending transaction waited
+    # max_block_interval milliseconds, so a quiet pool is sealed in time even if no other transaction arrives
+    # The thread only holds a weak reference to the blockchain between two checks, and stops with close()
+    def start_block_timer(self):
+        with self.chain_lock:
+            if self.block_timer is not None or self.block_timer_stop.is_set():
+                return
+            self.block_timer = threading.Thread(target=run_block_timer, args=(weakref.ref(self), self.block_timer_stop, self.max_block_interval / 1000),
+                                                name="macoin-block-timer", daemon=True)
+            self.block_timer.start()
+
+
+    # Add a transaction to the pending transaction pool
+    # Returns True if the pool is full or its oldest transaction waited long enough: the caller then produces a block, once it released its wallet locks
+    # Otherwise the block timer produces the block once the oldest pending transaction waited long enough
+    # The amount of a transfer is reserved in pending_debits, so the caller must hold the sender's wallet lock
+    def submit_transaction(self, transaction):
+        if self.block_timer is None:
+            self.start_block_timer()
+        with self.chain_lock:
+            if not self.mempool: # Start timing with the first pending transaction
+                self.mempool_since = datetime.datetime.now()
+            self.mempool.append(transaction)
+            if transaction.tag == Transfer.tag: # Reserve the amount of pending transfers
+                self.pending_debits[transaction.sender] = self.pending_debits.get(transaction.sender, 0) + transaction.amount
+            waited = (datetime.datetime.now() - self.mempool_since).total_seconds() * 1000 # Milliseconds since the oldest pending transaction
+            return len(self.mempool) >= self.max_block_transactions or waited >= self.max_block_interval
+
+
+    # Block producer: packs up to max_block_transactions pending transactions into a single block
+    @metrics.timed("produce_block")
+    def produce_block(self):
+        with self.chain_lock: # Take the next transactions off the pool
+            if not self.mempool: # Nothing to pack
+                return None
+            pending = self.mempool[:self.max_block_transactions]
+            self.mempool = self.mempool[self.max_block_transactions:]
+            self.mempool_since = datetime.datetime.now() if self.mempool else None
+
+        transactions = []
+        balances = []
+        with self.wallet_locks(*(address for transaction in pending if transaction.tag == Transfer.tag for address in transaction[:2])):
+            for transaction in pending: # Apply the pending transactions in the order they were submitted
+                if transaction.tag == Transfer.tag: # Transfers move the funds now
+                    sender, receiver, amount = transaction[:3]
+                    self.pending_debits[sender] -= amount # Release the reserved amount
+                    if not self.pending_debits[sender]:
+                        del self.pending_debits[sender]
+                    try:
+                        receiving_wallet = self.wallets[receiver] # Both wallets must still exist before the sender is debited
+                        self.wallets[sender].deduct_amount(amount)
+                    except (KeyError, ValueError): # Drop transfers that can no longer be settled (e.g. wallet deleted in the meantime)
+                        self.notify(f"Error. Pending transfer from {sender} to {receiver} could not be settled.")
+                        continue
+                    receiving_wallet.add_amount(amount)
+                    balances.append({sender: self.wallets[sender].balance, receiver: self.wallets[receiver].balance})
+                else:
+                    balances.append({})
+                transactions.append(transaction)
+
+            if transactions: # Add the block to the blockchain
+                self.add_block_transactions(transactions, None, balances, execute_contracts=False)
+
+        for transaction in transactions: # Execute the smart contracts the transactions can affect, once the wallets are unlocked
+            self.execute_contract(self.triggered_contracts(transaction), transaction)
+        self.maybe_save_state()
+        return len(transactions) # Return the number of transactions packed into the block
+
+
+    # Produce blocks until the pending transaction pool is empty
+    def flush_mempool(self):
+        while self.mempool:
+            self.produce_block()
+
+
+    # Create a new wallet registered to the blockchain
+    # A password given by the caller (e.g. the server) is used as is, so that it is registered and journaled together with the wallet
+    def create_wallet(self, testing=False, password=None):
+        if password is not None: # Password provided, no prompt
+            pass
+        elif not testing: # If not in testing mode, prompt user for input
+            # Prompts user to enter a password for the wallet
+            password = input("Enter a password for your wallet: ")
+
+        
+        # Set initial wallet_created tag to False
+        wallet_created = False
+        
+        # Finds a 5-byte hexadecimal address that is not yet in use, registers the wallet instance to wallet dictionary
+        for i in range(5):
+            address = secrets.token_hex(5) # 5-byte hexadecimal address
+            if address in self.wallets: # If address already in use, skip
+                continue
+            else:
+                creation_date = datetime.datetime.now() # Get current date and time
+                phrase = " ".join([secrets.choice(recovery_words) for i in range(12)]) # 12-word recovery phrase
+                address = sys.intern(address) # Transactions share the wallet's address string
+                self.wallets[address] = Wallet(address, password, phrase, creation_date, self.starting_balance) # Register wallet to wallet dictionary
+                self.journal("wallet", address, password, phrase, creation_date) # Record the new wallet in the registry journal
+                self.write_blocks([WalletCreation(address, self.starting_balance, Block.now())], [{address: self.starting_balance}]) # Record the starting balance on the chain
+                self.notify(f"This is your wallet's address: '{address}'.\nThis is your recovery phrase: {phrase}")
+                wallet_created = True # Set wallet_created tag to True
+                break
+        
+        # Return error if wallet was not created
+        if not wallet_created:
+            raise ValueError("Error. Wallet not created. Please try again.")
+        else:
+            return address # Return the wallet address (for ease of testing)
+        
+    
+    # Random recovery phrases of 12 words, generated in bulk
+    # --> Word indices are drawn from one buffer of random bytes: bytes below 200 are mapped to one of the 100 words (byte % 100), the others
+    #     are dropped so that every word stays equally likely
+    @staticmethod
+    def generate_phrases(number):
+        table = bytes(byte % len(recovery_words) for byte in range(256))
+        rejected = bytes(range(200, 256))
+        indices = b""
+        while len(indices) < 12 * number:
+            missing = 12 * number - len(indices)
+            indices += secrets.token_bytes(missing * 5 // 4 + 16).translate(table, rejected)
+        return [" ".join([recovery_words[index] for index in indices[start:start + 12]]) for start in range(0, 12 * number, 12)]
+
+
+    # Random 5-byte hexadecimal addresses, not in use and distinct from each other, generated in bulk
+    def generate_addresses(self, number):
+        addresses = set()
+        while len(addresses) < number:
+            missing = number - len(addresses)
+            candidates = secrets.token_bytes(5 * missing).hex()
+            addresses.update(candidates[start:start + 10] for start in range(0, 10 * missing, 10))
+            addresses.difference_update(self.wallets.keys() & addresses) # Drop addresses already in use
+        return [sys.intern(address) for address in addresses] # Transactions share the wallet's address string
+
+
+    # Create many wallets at once, for migrations and load tests
+    # passwords is None (testing wallets), one password for all wallets, or one password per wallet
+    # Wallets are registered in one step, journaled together, and their starting balances are recorded in blocks of max_block_transactions
+    # Returns the (address, recovery phrase) pairs of the new wallets, also written to output (a file path, as CSV lines) if given
+    def create_wallets(self, number, passwords=None, output=None):
+        if passwords is None or isinstance(passwords, str):
+            passwords = itertools.repeat(passwords, number)
+        else:
+            passwords = list(passwords)
+            if len(passwords) != number:
+                raise ValueError("Error. One password is required per wallet.")
+
+        addresses = self.generate_addresses(number)
+        phrases = self.generate_phrases(number)
+        creation_date = datetime.datetime.now()
+        timestamp = Block.now()
+        wallets = [Wallet(address, password, phrase, creation_date, self.starting_balance)
+                   for address, password, phrase in zip(addresses, passwords, phrases)]
+        self.wallets.update(zip(addresses, wallets)) # Register the wallets to the wallet dictionary
+        self.journal_many("wallet", [(wallet.address, wallet.password, wallet.phrase, creation_date) for wallet in wallets])
+        self.write_blocks([WalletCreation(address, self.starting_balance, timestamp) for address in addresses],
+                          [{address: self.starting_balance} for address in addresses]) # Record the starting balances on the chain
+        self.maybe_save_state()
+
+        created = list(zip(addresses, phrases))
+        if output:
+            with open(output, "w") as f:
+                f.write("address,phrase\n")
+                f.writelines(f"{address},{phrase}\n" for address, phrase in created)
+        self.notify(f"{number} wallets created." + (f" Addresses and recovery phrases written to '{output}'." if output else ""))
+        return created
+
+
+    # Function to change wallet password
+    def change_password(self, address):
+        if self.authenticate_user(address): # Check if user is authenticated
+            self.wallets[address].password = input("Enter a new password:") # Prompt user for new password
+            self.journal("password", address, self.wallets[address].password)
+            print("Password changed successfully.")
+        else: # Return error if user is not authenticated
+            raise ValueError("Error. Unable to change password.")
+        
+    
+    # Function to recover wallet using recovery phrase
+    def recover_wallet(self, address):
+        if address in self.wallets: # Check if wallet exists
+            recovery_phrase = input("Enter your recovery phrase: ") # Prompt user for recovery phrase    
+            if recovery_phrase == self.wallets[address].phrase: # Check if recovery phrase is correct
+                password = input("Wallet recovered successfully. Enter new password: ") # Prompt user for new password
+                self.wallets[address].password = password # Set new password
+                self.journal("password", address, password)
+                print("Password reset successfully.")
+            else: # Return error if recovery phrase is incorrect
+                raise ValueError("Error. Incorrect recovery phrase.")
+        else: # Return error if wallet does not exist
+            raise ValueError("Error. Wallet not found. Please try again.")
+    
+    
+    # Function to enable user to delete their wallet
+    def delete_wallet(self, address):
+        if self.authenticate_user(address): # Check if user is authenticated
+            for i in range(3): # Allow 3 attempts
+                answer = input(f"Are you sure you want to delete wallet {address}? (yes/no): ") # Prompt user for confirmation
+                if answer.lower() == "yes": # If user confirms, delete wallet
+                    with self.wallet_locks(address): # waits until the transfers of the wallet are done
+                        balance = self.wallets.pop(address).balance
+                        self.write_blocks([WalletDeletion(address, balance, Block.now())], [{}]) # Record the balance leaving the supply on the chain
+                    print("Wallet deleted.")
+                    break
+                elif answer.lower() == "no": # If user declines, do not delete wallet
+                    print("Wallet not deleted.")
+                    break
+                else: # Return error if input is invalid
+                    print("Invalid input. answer must be 'yes' or 'no'.")
+        else: # Return error if user is not authenticated
+            raise ValueError("Error. Unable to delete wallet.")
+
+
+    # Return wallet balance
+    def get_wallet_balance(self, address):
+        if address in self.wallets: # Check if wallet exists
+            return self.to_coins(self.wallets[address].balance) # Return wallet balance, in coins
+        else: # Return error if wallet does not exist
+            raise ValueError("Error. Wallet not found.")
+    
+
+    # Return wallet balance minus the amounts of its pending outgoing transfers, in coins
+    def get_available_balance(self, address):
+        return self.to_coins(self.get_available_units(address))
+
+
+    # Wallet balance minus the amounts of its pending outgoing transfers, in minor units
+    def get_available_units(self, address):
+        if address not in self.wallets: # Check if wallet exists
+            raise ValueError("Error. Wallet not found.")
+        return self.wallets[address].balance - self.pending_debits.get(address, 0)
+
+
+    # Function to transfer coins between wallets, takes sender, receiver addresses, along with amount, data, and sender password as inputs
+    # With enqueue (by default when batching is enabled), the transfer is added to the pending transaction pool instead of sealing a block immediately
+    def transfer_funds(self, sender, receiver, amount, data, testing=False, enqueue=None):
+        start = time.perf_counter()
+        try:
+            if not testing: # If not in testing mode, check if user authenticated
+                self.authenticate_user(sender) # Check if sender exists and is authenticated
+
+            if enqueue is None: # Default to the blockchain's batching mode
+                enqueue = self.batching
+            amount = self.to_units(amount) # Amount in minor units
+
+            if receiver in self.wallets: # Check if receiver wallet exists
+                sender_wallet = self.wallets[sender]
+                receiver_wallet = self.wallets[receiver]
+                with self.wallet_locks(sender, receiver): # No other thread changes either balance between the check and the transfer
+                    available_balance = self.get_available_units(sender) # Balance minus pending debits
+                    # Check to see if sender balance is high enough, and if sender password is correct
+                    if available_balance >= amount > 0 and sender_wallet != receiver_wallet: # Check if sender balance is high enough, amount is positive, and sender is not receiver
+                        transaction = Transfer(sender_wallet.address, receiver_wallet.address, amount, data, Block.now())
+                        if enqueue: # Add the transaction to the pending transaction pool
+                            block_due = self.submit_transaction(transaction)
+                        else:
+                            # Deduct amount from sender wallet, add to receiver wallet
+                            sender_wallet.deduct_amount(amount)
+                            receiver_wallet.add_amount(amount)
+
+                            # Add the block containing the transaction to the blockchain
+                            balances = [{sender: sender_wallet.balance, receiver: receiver_wallet.balance}]
+                            self.add_block_transactions([transaction], None, balances, execute_contracts=False)
+
+                # Error messages for various cases
+                    elif available_balance < amount: # If sender balance is too low
+                        raise ValueError("Insufficient balance.")
+                    elif amount <= 0: # If amount is not positive
+                        raise ValueError("Amount must be positive.")
+                    elif sender_wallet == receiver_wallet: # If sender and receiver are the same
+                        raise ValueError("Sender and receiver must be different.")
+                    else:
+                        raise ValueError("Error. Please try again later.")
+
+                if enqueue:
+                    if block_due: # Produce a block once the pool is full or its oldest transaction waited long enough
+                        self.produce_block()
+                    self.notify("Transfer queued.")
+                    return
+                # Automatically execute the smart contracts the transaction can affect, once the wallets are unlocked
+                self.execute_contract(self.triggered_contracts(transaction), transaction)
+                self.maybe_save_state()
+                self.notify("Funds transferred successfully.")
+
+            elif receiver not in self.wallets: # If receiver wallet does not exist
+                raise ValueError("Receiver wallet not found.")
+            else:
+                raise ValueError("Error. Please try again later.")
+        finally: # Rejected transfers are timed too
+            if metrics.enabled:
+                transfer_duration.observe(time.perf_counter() - start)
+
+
+    # Function to settle many transfers in one call, takes an iterable of (sender, receiver, amount, data) as input
+    # The whole batch is validated against the balances resulting from the transfers before it, and applied all-or-nothing:
+    # if any transfer is invalid, an error is raised and no balance is changed. The transfers are written to blocks of up to
+    # max_block_transactions transfers, and the smart contracts are evaluated once for the whole batch
+    @metrics.timed("transfer_many")
+    def transfer_many(self, transfers, testing=False):
+        transfers = list(transfers)
+        if not testing: # If not in testing mode, check if the senders are authenticated
+            for sender in dict.fromkeys(transfer[0] for transfer in transfers):
+                self.authenticate_user(sender)
+
+        # The wallets of the batch stay locked from the validation until the blocks are written
+        with self.wallet_locks(*(address for transfer in transfers for address in transfer[:2])):
+            # Validate the whole batch on running balances (net of pending debits), without changing any wallet
+            running_balances = {}
+            amounts = [] # Amounts in minor units
+            for number, (sender, receiver, amount, data) in enumerate(transfers, start=1):
+                try:
+                    amount = self.to_units(amount)
+                except ValueError as e:
+                    raise ValueError(f"Transfer {number}: {e}")
+                amounts.append(amount)
+                if sender not in self.wallets: # If sender wallet does not exist
+                    raise ValueError(f"Transfer {number}: Sender wallet not found.")
+                if receiver not in self.wallets: # If receiver wallet does not exist
+                    raise ValueError(f"Transfer {number}: Receiver wallet not found.")
+                if amount <= 0: # If amount is not positive
+                    raise ValueError(f"Transfer {number}: Amount must be positive.")
+                if sender == receiver: # If sender and receiver are the same
+                    raise ValueError(f"Transfer {number}: Sender and receiver must be different.")
+                for address in (sender, receiver):
+                    if address not in running_balances:
+                        running_balances[address] = self.get_available_units(address)
+                if running_balances[sender] < amount: # If sender balance is too low at this point of the batch
+                    raise ValueError(f"Transfer {number}: Insufficient balance.")
+                running_balances[sender] -= amount
+                running_balances[receiver] += amount
+
+            # Apply the batch: the transfers were validated, so the balances are updated directly
+            transactions = []
+            balances = []
+            timestamp = Block.now()
+            for (sender, receiver, _, data), amount in zip(transfers, amounts):
+                sender_wallet, receiver_wallet = self.wallets[sender], self.wallets[receiver]
+                sender_wallet.balance -= amount
+                receiver_wallet.balance += amount
+                transactions.append(Transfer(sender_wallet.address, receiver_wallet.address, amount, data, timestamp))
+                balances.append({sender: sender_wallet.balance, receiver: receiver_wallet.balance})
+
+            self.write_blocks(transactions, balances) # Write the transfers to a bounded number of blocks
+
+        # Evaluate the smart contracts once for the batch: transaction contracts for every matching transfer, funding contracts once at the end
+        funding_contracts = []
+        for transaction in transactions:
+            sender, receiver, amount = transaction[:3]
+            if (sender, receiver, amount) in self.SCtransaction_index:
+                self.execute_contract(self.SCtransaction_index[(sender, receiver, amount)], transaction)
+            funding_contracts += self.SCfunding_index.get(sender, []) + self.SCfunding_index.get(receiver, [])
+        self.execute_contract(list(dict.fromkeys(funding_contracts)))
+        self.maybe_save_state()
+
+        self.notify(f"{len(transactions)} transfers settled successfully.")
+        return len(transactions) # Return the number of transfers settled
+
+
+    ###############
+    ### CURSORS ###
+    ###############
+    # Listings of the chain are streamed: blocks are read one at a time and rows are rendered one page at a time,
+    # so memory use does not grow with the length of the chain
+    # --> start is a block height (negative heights count from the end of the chain), direction is 'forward' (towards the last block)
+    #     or 'backward' (towards the genesis block). Blocks added while a listing runs are not part of it
+
+    # Heights of the blocks from start in the given direction
+    def block_heights(self, start=None, direction="forward"):
+        if direction not in ("forward", "backward"):
+            raise ValueError("Error. Direction must be 'forward' or 'backward'.")
+        length = len(self.chain)
+        if start is None:
+            start = 0 if direction == "forward" else length - 1
+        elif start < 0:
+            start += length
+        if direction == "forward":
+            return range(max(start, 0), length)
+        return range(min(start, length - 1), -1, -1)
+
+
+    # Generator over the blocks from start in the given direction, as (height, block), reading one block at a time
+    def iter_blocks(self, start=None, direction="forward"):
+        for height in self.block_heights(start, direction):
+            yield height, self.chain[height]
+
+
+    # Ledger rows of the transfers in the blocks from start in the given direction (the ledger is in chain order)
+    def transaction_rows(self, start=None, direction="backward"):
+        heights = self.block_heights(start, direction)
+        if not heights:
+            return range(0)
+        if direction == "forward":
+            return range(bisect.bisect_left(self.ledger.block_index, heights[0]), len(self.ledger))
+        return range(bisect.bisect_right(self.ledger.block_index, heights[0]) - 1, -1, -1)
+
+
+    # Hash of the block at a block index, shown as the transaction hash of the transfers it holds
+    def block_hash(self, block_index):
+        return self.chain[block_index].hash
+
+
+    # Generator over the transfers in the blocks from start in the given direction, as dictionaries (without pandas)
+    def iter_transactions(self, start=None, direction="backward"):
+        ledger = self.ledger
+        for row in self.transaction_rows(start, direction):
+            yield {"Block Index": ledger.block_index[row],
+                   "Transaction Hash": self.block_hash(ledger.block_index[row]),
+                   "Timestamp": Block.decode_timestamp(ledger.timestamp[row]),
+                   "Sender": ledger.addresses[ledger.sender[row]],
+                   "Receiver": ledger.addresses[ledger.receiver[row]],
+                   "Amount": self.to_coins(ledger.amount[row]),
+                   "Reference": ledger.reference[row]}
+
+
+    # Split an iterable into lists of up to page_size items, taken from the iterable only when the page is requested
+    @staticmethod
+    def pages(items, page_size):
+        items = iter(items)
+        while True:
+            page = list(itertools.islice(items, page_size))
+            if not page:
+                return
+            yield page
+
+
+    # Ask whether the next page of a listing should be shown
+    def next_page(self):
+        return input("Press Enter to show the next page, or type 'q' to stop: ").strip().lower() != "q"
+
+
+    # Basic print chain function: prints contents of the blocks on chain, from start in the given direction
+    # With a page_size, asks before every further page of page_size blocks
+    def print_chain(self, start=None, direction="forward", page_size=None):
+        blocks = self.iter_blocks(start, direction)
+        for page_number, page in enumerate(self.pages(blocks, page_size) if page_size else [blocks]):
+            if page_number and not self.next_page():
+                break
+            for height, block in page:
+                print(f"Timestamp: {Block.decode_timestamp(block.timestamp)}")
+                print(f"Data: {block.data}")
+                print(f"Previous Hash: {block.previous_hash}")
+                print(f"Merkle Root: {block.merkle_root}")
+                for transaction in block.transactions:
+                    print(f"Transaction: {transaction}")
+                print(f"Hash: {block.hash}")
+                print()
+
+    # Display chain diagram of the whole chain, or of a window: the last blocks, the blocks between heights start and stop (excluded),
+    # and/or only the blocks touching a wallet (its transfers and payouts) or a contract (its signatures and payouts)
+    # Windows of more than max_nodes blocks are summarized: runs of consecutive blocks are collapsed into single nodes, the most recent blocks staying in full
+    def display_chain_diagram(self, last=None, start=None, stop=None, wallet=None, contract=None, max_nodes=200):
+        from graphviz import Digraph
+        from IPython.display import display
+        dot = Digraph(comment='Blockchain', node_attr={'shape': 'box', 'style': 'filled', 'color': 'lightgrey', 'fillcolor': 'lightgrey'}, graph_attr={'rankdir': 'BT'})
+        dot.body += self.diagram_body(self.diagram_heights(last, start, stop, wallet, contract), max_nodes)
+        display(dot)
+
+
+    # Heights of the blocks shown by the chain diagram, in chain order
+    def diagram_heights(self, last=None, start=None, stop=None, wallet=None, contract=None):
+        length = len(self.chain)
+        start = 0 if start is None else max(start + length if start < 0 else start, 0)
+        stop = length if stop is None else min(stop + length if stop < 0 else stop, length)
+        if wallet is None and contract is None: # Every block of the window
+            heights = range(start, max(start, stop))
+        else: # Blocks touching the wallet or contract, found in the per-wallet and per-contract indexes
+            touched = set()
+            if wallet is not None and wallet in self.wallet_index:
+                touched.update(self.ledger.block_index[row] for row in self.wallet_index[wallet][0])
+            if contract is not None:
+                touched.update(self.contract_blocks.get(contract, ()))
+            heights = sorted(touched)
+            heights = heights[bisect.bisect_left(heights, start):bisect.bisect_left(heights, stop)]
+        return heights[-last:] if last else heights
+
+
+    # First fields of a transaction as shown in a diagram node, with its amount or balance in coins instead of minor units
+    def diagram_transaction(self, transaction):
+        coins = {name: self.to_coins(getattr(transaction, name)) for name in ("amount", "balance") if name in transaction._fields}
+        return tuple(transaction._replace(**coins))[:4]
+
+
+    # DOT fragments of a block, built once and cached (blocks never change): its hash, its node and its edge to the previous block
+    def diagram_fragment(self, height):
+        if height not in self.diagram_fragments:
+            block = self.chain[height]
+            transactions = block.transactions
+            # Constructing the label using HTML-like syntax without explicit width control
+            label_text = f"<<table border='0' cellspacing='0' cellborder='0'><tr><td align='left'><b>Previous Hash: {block.previous_hash}</b></td></tr>"
+            if block.previous_hash == "0":  # Only include the timestamp for the genesis block
+                label_text += f"<tr><td align='left'>Timestamp: {Block.decode_timestamp(block.timestamp)}</td></tr>"
+            label_text += f"<tr><td align='left'>Data: {block.data}</td></tr>"
+            if len(transactions) > 1: # Only summarize blocks packing several transactions
+                label_text += f"<tr><td align='left'>Transactions: {len(transactions)}</td></tr></table>>"
+            else:
+                label_text += f"<tr><td align='left'>Transaction: {self.diagram_transaction(transactions[-1]) if transactions else []}</td></tr></table>>"
+            # Node using the block's hash as the identifier, with increased margin to provide more space, and edge to the previous block
+            self.diagram_fragments[height] = (block.hash, f'\t"{block.hash}" [label={label_text} margin="0.4,0.2"]\n', f'\t"{block.hash}" -> "{block.previous_hash}"\n')
+        return self.diagram_fragments[height]
+
+
+    # DOT statements of the chain diagram for the given heights
+    def diagram_body(self, heights, max_nodes=200):
+        body = []
+        previous = previous_hash = None # Last block or run of blocks drawn
+        if len(heights) > max_nodes: # Summarized view: the older blocks are collapsed into runs, the most recent max_nodes // 2 blocks are drawn in full
+            detailed = max(max_nodes // 2, 1)
+            collapsed = heights[:-detailed]
+            run_length = -(-len(collapsed) // max(max_nodes - detailed, 1)) # Blocks per run, rounded up
+            for offset in range(0, len(collapsed), run_length):
+                run = collapsed[offset:offset + run_length]
+                node = f"run_{run[0]}_{run[-1]}"
+                body.append(f'\t{node} [label="Blocks {run[0]} to {run[-1]}\\n{len(run)} blocks" style="filled,dashed"]\n')
+                if previous_hash is not None:
+                    body.append(f'\t{node} -> {previous_hash}\n')
+                previous, previous_hash = run[-1], node
+            heights = heights[-detailed:]
+        for height in heights:
+            block_hash, node, edge = self.diagram_fragment(height)
+            body.append(node)
+            if previous is not None and previous == height - 1 and not previous_hash.startswith("run_"): # Add edges from this block to the previous block
+                body.append(edge)
+            elif previous is not None: # Blocks left out of the window in between
+                target = previous_hash if previous_hash.startswith("run_") else f'"{previous_hash}"'
+                label = f' [style=dashed label="{height - previous - 1} blocks"]' if height - previous > 1 else ""
+                body.append(f'\t"{block_hash}" -> {target}{label}\n')
+            previous, previous_hash = height, block_hash
+        return body
+
+
+    # Generator over the transaction history of a single wallet address, most recent first, as dictionaries (without pandas)
+    def iter_wallet_transactions(self, wallet_address):
+        if wallet_address not in self.wallet_index: # No transactions for this wallet
+            return
+        rows, balances_after_transfer = self.wallet_index[wallet_address]
+        ledger = self.ledger
+        for i in range(len(rows) - 1, -1, -1): # Loop through the wallet's ledger rows in reverse chronological order
+            row = rows[i]
+            sender, receiver = ledger.addresses[ledger.sender[row]], ledger.addresses[ledger.receiver[row]]
+            yield {"Block Index": ledger.block_index[row],
+                   "Transaction Hash": self.block_hash(ledger.block_index[row]),
+                   "Timestamp": Block.decode_timestamp(ledger.timestamp[row]),
+                   "Sender": sender,
+                   "Receiver": receiver,
+                   "Transaction Type": "Outgoing" if wallet_address == sender else "Incoming",
+                   "Amount": self.to_coins(ledger.amount[row]),
+                   "Balance after Transfer": self.to_coins(balances_after_transfer[i]),
+                   "Reference": ledger.reference[row]}
+
+
+    # Function to retrieve the transaction history of a single wallet address
+    @metrics.timed("get_wallet_transactions")
+    def get_wallet_transactions(self, wallet_address):
+        import numpy as np
+        import pandas as pd
+        # Check if the wallet exists
+        if wallet_address not in self.wallets:
+            print("Wallet not found.")
+            return pd.DataFrame()  # Return an empty DataFrame if wallet is not found
+
+        if wallet_address not in self.wallet_index: # Return an empty DataFrame if the wallet has no transactions
+            return pd.DataFrame()
+
+        # Select the wallet's rows of the columnar ledger in reverse chronological order (only the wallet's own transactions are visited)
+        rows, balances_after_transfer = self.wallet_index[wallet_address]
+        with self.chain_lock: # Copies of the wallet's rows and balances, at the same length (blocks are indexed under the chain lock)
+            rows, balances_after_transfer = rows[:], balances_after_transfer[:]
+        rows = np.frombuffer(rows, dtype=np.int64)[::-1]
+        df = self.ledger.to_frame(rows, self.block_hash)
+
+        # Determine how the wallet is involved in each transaction, and add the balance after each transfer
+        df.insert(5, "Transaction Type", np.where(df["Sender"] == wallet_address, "Outgoing", "Incoming"))
+        df.insert(7, "Balance after Transfer", np.frombuffer(balances_after_transfer, dtype=np.int64)[::-1] / self.scale)
+
+        return df
+    
+
+   # Function to print the transaction history of a single wallet address, most recent first, page_size transactions at a time
+    def print_wallet_transactions(self, wallet_address, page_size=100):
+        import pandas as pd
+        from IPython.display import display, HTML
+        if wallet_address not in self.wallets:
+            print("Wallet not found.")
+        if wallet_address not in self.wallets or wallet_address not in self.wallet_index: # Print error message if no transactions are found
+            raise ValueError("No transactions found for this wallet.")
+        for page_number, page in enumerate(self.pages(self.iter_wallet_transactions(wallet_address), page_size)):
+            if page_number and not self.next_page():
+                break
+            # Display the page of the transaction history in a formatted HTML table
+            html_table = pd.DataFrame(page).to_html(index=False, justify='center')
+            display(HTML(html_table))
+            
+    # Function to retrieve an overview of all wallets on the blockchain, read from the wallet statistics table
+    # By default the wallets are sorted by creation date (oldest first); with top, only the top wallets by the given column are returned, largest first
+    def get_wallets_overview(self, top=None, by="Balance"):
+        return self.wallet_stats.to_frame(top, by)
+
+
+    # Function to print the overview of all wallets on the blockchain (or of the top wallets by the given column), page_size wallets at a time
+    def print_wallets_overview(self, top=None, by="Balance", page_size=100):
+        from IPython.display import display, HTML
+        df = self.get_wallets_overview(top, by) # Retrieve the overview of all wallets
+        if df.empty: # Print error message if no wallets are found
+            raise ValueError("No wallets found.")
+        for offset in range(0, len(df), page_size):
+            if offset and not self.next_page():
+                break
+            # Display the page of the overview in a formatted HTML table
+            html_table = df.iloc[offset:offset + page_size].to_html(index=False, justify='center')
+            display(HTML(html_table))
+
+
+    # Function to retrieve all transactions across all wallets, built from the columnar ledger
+    def get_all_transactions(self):
+        # The ledger is in chain order: reverse it to have the most recent transactions at the top
+        return self.ledger.to_frame(block_hash=self.block_hash)[::-1].reset_index(drop=True)
+
+    # Function to print the transactions across all wallets from the block at height start in the given direction
+    # (by default most recent first), page_size transactions at a time
+    def print_all_transactions(self, page_size=100, start=None, direction="backward"):
+        from IPython.display import display, HTML
+        rows = self.transaction_rows(start, direction)
+        if not rows: # Print error message if no transactions are found
+            raise ValueError("No transactions found.")
+        for offset in range(0, len(rows), page_size):
+            if offset and not self.next_page():
+                break
+            # Display the page of transactions in a formatted HTML table, built from the columnar ledger
+            html_table = self.ledger.to_frame(rows[offset:offset + page_size], self.block_hash).to_html(index=False, justify='center')
+            display(HTML(html_table))
+
+
+##############################
+### SMART CONTRACT SECTION ###
+##############################
+    # positions of the amounts in the conditions of funding and transaction contracts, and number of conditions of each type
+    condition_amounts = {"funding": (3, 5), "transaction": (3, 7)}
+    condition_lengths = {"funding": 8, "transaction": 10}
+
+
+    # returns a copy of the conditions with their amounts converted from coins into minor units (as stored and evaluated)
+    # conditions of the wrong length for a funding or transaction contract are rejected before any amount is read
+    def conditions_to_units(self, conditions, contract_type):
+        conditions = list(conditions)
+        if contract_type in self.condition_lengths and len(conditions) != self.condition_lengths[contract_type]:
+            raise ValueError(f"Error. The conditions do not match a contract of type '{contract_type}'.")
+        for position in self.condition_amounts.get(contract_type, ()):
+            conditions[position] = self.to_units(conditions[position])
+        return conditions
+
+
+    # returns a copy of the conditions with their amounts converted from minor units back into coins (for display)
+    def conditions_to_coins(self, conditions, contract_type):
+        conditions = list(conditions)
+        for position in self.condition_amounts.get(contract_type, ()):
+            conditions[position] = self.to_coins(conditions[position])
+        return conditions
+
+
+    # Function to create a smart contract
+    def create_SC(self, address, conditions=None, contract_type=None, testing=False):
+        # function that initiates the process of creating a smart contract
+        if testing or self.authenticate_user(address): # checks to authenticate user unless in testing mode
+            for i in range(5):
+                contract_name = sys.intern("SC" + secrets.token_hex(5)) # Generate a 5-byte hexadecimal contract name
+                if contract_name in self.SC: # ensures that the contract name does not already exist
+                    continue
+                else: # creates the contract
+                    contract = self.create_contract(address, contract_name, conditions, contract_type, testing)    
+                    if contract != False and contract != None: # ensures the contract is created successfully
+                        self.notify(f"Smart Contract {contract_name} created successfully.")
+                    break
+        else: # returns an error if the user is not authenticated
+            raise ValueError("Error. Could not create contract. Please try again later.")
+
+
+    # creates contract
+    def create_contract(self, address, contract_name, conditions, contract_type, testing):
+        # function that creates a contract based on the conditions and contract type specified
+        allowed_contract_types = ["funding", "transaction", "other"] # standardized contract types compatible with the blockchain
+        # checking conditions
+        if conditions == None:
+            conditions, contract_type = self.conditions() # checks if conditions are specified, otherwise prompts user to specify them
+        
+        elif not isinstance(conditions, list): # checks if conditions are in list format
+            self.notify("Conditions could not be automated. Please check execution of contract manually.")
+            conditions = [conditions] # converts conditions to list format
+            contract_type = "other" # sets contract type to 'other' as conditions could not be automated
+
+        elif contract_type in allowed_contract_types: # checks if contract type is in allowed contract types
+            # does not check whether the conditions in the list fit into the selected contract type
+            # Assumption that conditions and contract types are correct
+            conditions = conditions
+            contract_type = contract_type
+        
+        else: # if contract type is not in allowed contract types, sets contract type to 'other'
+            contract_type = "other"
+            self.notify("Contract type not recognized. Defaulting to type 'other'. See explanation for details.")
+            choice = input("Do you want to see the explanation of the contract types? (yes/no): ") # asks user if they want to see the explanation of the contract types
+            if choice.lower() == "yes":
+                smart_contract.explain_conditions() # shows the explanation of standardized contract types
+
+        conditions = self.conditions_to_units(conditions, contract_type) # amounts are stored in minor units
+        contract = self.accept_contract(address, contract_name, conditions, contract_type, testing) # accepts the contract
+        return contract
+
+
+    # checks the conditions of the contract
+    def conditions(self):
+        # function that checks whether the conditions of the contract are valid or enables the user to specify them directly
+        allowed_contract_types = ["1) funding", "2) transaction", "3) other"]
+        for i in range(3):
+            choice = int(input(f"What type of contract do you want (1,2,3)? {allowed_contract_types}")) # asks user to specify the contract type they would like to create
+            
+            if choice == 1: # funding
+                # When wallet A reaches X, then send Y to B
+                contract_type = "funding"
+                for i in range(3):
+                    wallet_address = input("Which wallet must reach a certain funding goal?") # asks user for the wallet address that must reach a certain funding goal
+                    if wallet_address in self.wallets: # checks if the wallet address exists
+                        break
+                    else: # returns an error if the wallet address provided does not exist
+                        print("Wallet not found.")
+                else: # this else block executes when the for loop completes normally (i.e., it didn't encounter a break)
+                    raise ValueError("Failed to provide a valid wallet address after 3 attempts.")
+
+                for i in range(3):
+                    amount_total = float(input("What is the funding goal?")) # asks user for the funding goal
+                    if isinstance(amount_total, float): # checks if the funding goal is a number
+                        break
+                    else: # returns an error if the funding goal provided is not a number
+                        print("Please enter a number.")
+                else: # this else block executes when the for loop completes normally (i.e., it didn't encounter a break)
+                    raise ValueError("Failed to provide a valid funding goal after 3 attempts.")
+
+                for i in range(3):
+                    amount_indiv = float(input("How much will you transfer if the goal is reached?")) # asks user for the amount to transfer if the goal is reached
+                    if isinstance(amount_indiv, float) and amount_indiv > 0: # checks if the amount to transfer is a number and positive
+                        # contracts do not allow to transfer 0 or negative amounts, as this would not make sense in the context of the contract and without the authorization of the parties
+                        break
+                    else: # returns an error if the amount to transfer is not a number or not positive
+                        print("Please enter a number.")
+                else: # this else block executes when the for loop completes normally (i.e., it didn't encounter a break)
+                    raise ValueError("Failed to provide a valid amount to transfer after 3 attempts.")
+
+                for i in range(3):
+                    receiver = input("Who will you send the money to?") # asks user for the receiver of the funds if the goal is reached
+                    if receiver in self.wallets: # ensures that the receiver wallet exists
+                        break
+                    else: # returns an error if the receiver wallet does not exist
+                        print("Wallet not found.")
+                else: # this else block executes when the for loop completes normally (i.e., it didn't encounter a break)
+                    raise ValueError("Failed to provide a valid receiver wallet address after 3 attempts.")
+
+                conditions = ["When wallet ", wallet_address, " reaches ", amount_total, ", then send ", amount_indiv, " to ", receiver] # automates the inputs into the expected format
+                return conditions, contract_type
+
+            elif choice == 2: # transaction
+                # When A sends money to B, I send money to C
+                contract_type = "transaction"
+                for i in range(3):
+                    wallet_address_A = input("Which wallet must transfer an amount of tokens?") # asks user for the wallet address that must transfer an amount of tokens
+                    if wallet_address_A in self.wallets:
+                        break
+                    else: # returns an error if the wallet address provided does not exist
+                        print("Wallet not found.")
+                else: # this else block executes when the for loop completes normally (i.e., it didn't encounter a break)
+                    raise ValueError("Failed to provide a valid wallet address for transfer after 3 attempts.")
+
+                for i in range(3):
+                    wallet_address_B = input("To which wallet must transfer go?") # asks user for the wallet address that must receive the tokens
+                    if wallet_address_B in self.wallets: # checks if the wallet address exists
+                        break
+                    else: # returns an error if the wallet address provided does not exist
+                        print("Wallet not found.")
+                else: # this else block executes when the for loop completes normally (i.e., it didn't encounter a break)
+                    raise ValueError("Failed to provide a valid wallet address for receiving transfer after 3 attempts.")
+
+                for i in range(3):
+                    amount_total = float(input("How much must be transferred minimum (0 if any transaction, positive sum if transfer must have certain size and negative number if wallet receives funds)?")) # asks user for the minimum amount that must be transferred
+                    if isinstance(amount_total, float): # checks if the amount to transfer is a number
+                        break
+                    else: # returns an error if the amount to transfer is not a number
+                        print("Please enter a number.")
+                else: # this else block executes when the for loop completes normally (i.e., it didn't encounter a break)
+                    raise ValueError("Failed to provide a valid amount to transfer after 3 attempts.")
+
+                for i in range(3):
+                    amount_indiv = float(input(f"How much will you transfer if the the transaction between {wallet_address_A} and {wallet_address_B} occurs?")) # asks user for the amount to transfer if the transaction occurs
+                    if isinstance(amount_indiv, float) and amount_indiv > 0: # checks if the amount to transfer is a number and positive
+                        # contracts do not allow to transfer 0 or negative amounts, as this would not make sense in the context of the contract and without the authorization of the parties
+                        break
+                    else: # returns an error if the amount to transfer is not a number or not positive
+                        print("Please enter a number.")
+                else: # this else block executes when the for loop completes normally (i.e., it didn't encounter a break)
+                    raise ValueError("Failed to provide a valid amount to transfer after 3 attempts.")
+
+                for i in range(3):
+                    receiver = input("Who will you send the money too?") # asks user for the receiver of the funds if the transaction occurs
+                    if receiver in self.wallets: # ensures that the receiver wallet exists
+                        break
+                    else: # returns an error if the receiver wallet does not exist
+                        print("Wallet not found.")
+                else: # this else block executes when the for loop completes normally (i.e., it didn't encounter a break)
+                    raise ValueError("Failed to provide a valid receiver wallet address after 3 attempts.")
+
+                conditions = ["When wallet ", wallet_address_A, " transfers ", amount_total, " to ", wallet_address_B, ", then I send ", amount_indiv, " to ", receiver] # automates the inputs into the expected format
+                return conditions, contract_type
+            
+            elif choice == 3: # other
+                conditions = input("Please specify the conditions of the contract: ") # asks user to specify the conditions of the contract
+                contract_type = "other" # sets contract type to 'other' as conditions could not be automated
+                if not isinstance(conditions, list): # checks if conditions are in list format
+                    conditions = [conditions]
+                return conditions, contract_type
+                
+        else: # returns an error if the user does not select a valid contract type
+            raise ValueError("Error. Your contract meets neither of the acceptable conditions. Please try again later.")
+    
+
+    # accepts contract
+    def accept_contract(self, address, contract_name, conditions=None, contract_type=None, testing=False):
+        # contract that must be accepted by each party signing a given smart contract, unless in testing mode
+        contract = False
+        if testing: # if in testing mode, automatically accepts the contract
+            answer = "yes"
+
+        else: # if not in testing mode, prompts user to accept the contract
+            for i in range(3):
+                answer = input("Did you read the conditions and accept the contract? (yes/no): ") # asks user if they wish to accept the contract based on the conditions
+                if answer.lower() == "yes": # if user claims to have read the conditions and wants to accept the contract, continues
+                    break
+                elif answer.lower() == "no": # if user declines the contract, returns an error and does not accept the contract
+                    raise ValueError("Contract not accepted.")
+                else: # if user does not provide a valid input, returns an error
+                    print("Invalid input. answer must be 'yes' or 'no'.")
+
+        if answer.lower() == "yes": # if user wants to accepts the contract, continues
+            if contract_name not in self.SC: # compiles the conditions of a new contract before anything is registered
+                contract = smart_contract(address, contract_name, conditions, contract_type)
+            with self.contract_lock: # the contract registry does not change while another thread evaluates the contracts
+                if contract_name not in self.SC.keys(): # if the contract does not exist already, creates the contract
+                    self.notify("Contract created and accepted.")
+                    self.SC[contract_name] = contract # stores the contract, with its compiled terms
+                    self.index_contract(contract) # registers the contract in the trigger index
+                    self.journal("contract", contract_name, address, conditions, contract_type) # records the new contract in the registry journal
+                elif self.SC[contract_name].state == "active": # if the contract already exists, accepts the contract
+                    contract = self.SC[contract_name]
+                    self.notify("Contract accepted.")
+                else: # executed and deleted contracts cannot be signed anymore
+                    raise ValueError(f"Error. Contract {contract_name} is {self.SC[contract_name].state}.")
+
+                if contract_name in self.contract_parties.keys(): # if the contract already has parties, appends the new party to the list of parties
+                    self.contract_parties[contract_name].append(address)
+                    self.notify(f"You have signed contract {contract_name}.")
+                else: # if the contract does not have parties yet, due to just having been created, creates a list of parties with the first party
+                    self.contract_parties[contract_name] = [address]
+                    self.notify(f"You have signed contract {contract_name}.")
+
+            transaction = ContractSignature(contract_name, address, Block.now()) # creates a transaction for the contract to be added to the blockchain
+            if self.batching: # adds the signature to the pending transaction pool
+                if self.submit_transaction(transaction): # produces a block if the pool is full or waited long enough
+                    self.produce_block()
+            else:
+                self.add_block(transaction) # adds the block to the blockchain, the block data being the block number
+
+        return contract
+
+
+    # function to show a contract or all contracts if no contract name is specified
+    def show_contracts(self, contract_name=None):
+        if contract_name in self.SC.keys(): # shows a specific contract, if the contract exists and is specified
+            contract = self.SC[contract_name]
+            parties = self.contract_parties[contract_name]
+            conditions = self.conditions_to_coins(contract.conditions, contract.contract_type)
+            return print(f"Contract {contract_name}: \n",
+                        f"{contract}\n",
+                        f"Type: {contract.contract_type}\n",
+                        f"State: {contract.state}\n",
+                        f"Conditions: {conditions}\n",
+                        f"Parties: {parties}\n")
+
+        elif contract_name not in self.SC.keys() and contract_name != None: # returns an error if the contract is specified but does not exist
+            raise ValueError("Error. Contract not found.")
+
+        else: # shows all contracts if no contract is specified
+            for contract in self.SC.keys():
+                print(f"Contract {contract} ({self.SC[contract].state}) with following parties: {self.contract_parties[contract]}.")
+                print(contract)
+    
+
+    # adds a party to contract
+    def add_party_SC(self, address, contract_name, testing=False):
+        if testing or self.authenticate_user(address): # checks to authenticate user unless in testing mode
+            if contract_name in self.SC.keys() and self.SC[contract_name].state == "active": # checks if the contract exists and is still active
+                self.accept_contract(address, contract_name, testing=testing) # proceeds to accept the contract
+            else: # returns an error if the contract does not exist
+                raise ValueError("Error. Contract not found.")
+        else: # returns an error if the user is not authenticated nor in testing mode
+            raise ValueError("Error. Please try again later.")
+
+
+    # function to show all parties of a contract
+    def show_parties_SC(self, contract_name):        
+        if contract_name in self.contract_parties.keys(): # checks if the contract exists
+            parties = self.contract_parties[contract_name] # shows the parties of the contract
+            return parties
+        else: # returns an error if the contract does not exist
+            raise ValueError("Error. Contract not found.")
+
+
+    # registers an active funding or transaction contract in the trigger index, so that it is only evaluated when a block can affect it
+    # funding contracts can only fire when the watched wallet's balance changes, transaction contracts when a matching (A, B, amount) transfer lands
+    def index_contract(self, contract):
+        if contract.terms is None or contract.state != "active": # contracts of type 'other' and finished contracts are never evaluated
+            return
+        index = self.SCfunding_index if isinstance(contract.terms, FundingTerms) else self.SCtransaction_index
+        index.setdefault(contract.terms.key, []).append(contract.contract_name)
+
+
+    # removes a contract from the trigger index
+    def unindex_contract(self, contract_name):
+        contract = self.SC.get(contract_name)
+        if contract is None or contract.terms is None: # contracts of type 'other' are never indexed
+            return
+        index = self.SCfunding_index if isinstance(contract.terms, FundingTerms) else self.SCtransaction_index
+        key = contract.terms.key
+        if contract_name in index.get(key, []):
+            index[key].remove(contract_name)
+            if not index[key]: # drops empty entries to keep the index small
+                del index[key]
+
+
+    # ends the lifecycle of a contract ('executed' or 'deleted'): it stays in the registry but is never evaluated again
+    def finish_contract(self, contract_name, state="deleted"):
+        self.unindex_contract(contract_name)
+        self.SC[contract_name].state = state
+
+
+    # returns the names of the contracts a transaction can affect, looked up in the trigger index
+    def triggered_contracts(self, transaction):
+        if not transaction: # blocks without a transaction cannot trigger any contract
+            return []
+        if transaction.tag == ContractSignature.tag: # a signature can only trigger the signed contract itself
+            contract = self.SC.get(transaction.contract_name)
+            return [transaction.contract_name] if contract is not None and isinstance(contract.terms, FundingTerms) else []
+        if transaction.tag != Transfer.tag: # payouts trigger their follow-up contracts themselves (see execute_contract), wallet creations and deletions none
+            return []
+        sender, receiver, amount = transaction[:3]
+        contract_names = self.SCfunding_index.get(sender, []) + self.SCfunding_index.get(receiver, []) # funding contracts watching one of the wallets involved
+        contract_names += self.SCtransaction_index.get((sender, receiver, amount), []) # transaction contracts matching the transfer
+        return list(dict.fromkeys(contract_names)) # removes duplicates while keeping the order
+
+
+    # function that automatically executes smart contracts if conditions are met
+    # only the given contracts are evaluated (as found by the trigger index), or every active contract on the blockchain if none are given
+    # transaction contracts are checked against the given transaction, by default the last transaction on the blockchain
+    def execute_contract(self, contract_names=None, transaction=None):
+        start = time.perf_counter()
+        if contract_names is None: # full scan over the active contracts, which are exactly the contracts in the trigger indexes
+            contract_names = [contract_name for index in (self.SCfunding_index, self.SCtransaction_index) for names in index.values() for contract_name in names]
+        elif isinstance(contract_names, str): # a single contract was specified
+            contract_names = [contract_names]
+        if transaction is None:
+            transaction = self.chain[-1].transaction
+        with self.contract_lock: # contracts are evaluated by one thread at a time, before any wallet is locked
+            pending = list(contract_names)
+            evaluated = set()
+            fired = 0
+
+            for contract_name in pending: # loops through the contracts to evaluate, including funding contracts triggered by payouts of other contracts (appended below)
+                contract = self.SC.get(contract_name)
+                if contract_name in evaluated or contract is None or contract.state != "active" or contract.terms is None: # skips contracts already evaluated, finished or not automated
+                    continue
+                evaluated.add(contract_name)
+                terms = contract.terms
+                if not terms.triggered(self.wallets, transaction): # most evaluations end here, without locking any wallet
+                    continue
+
+                # locks the parties and the wallets named in the terms while the contract is checked again and paid out
+                with self.wallet_locks(*self.contract_parties[contract_name], *terms.addresses):
+                    if not terms.triggered(self.wallets, transaction):
+                        continue
+                    payouts, balances = [], []
+                    receiver_wallet = self.wallets.get(terms.receiver)
+                    for sender in self.contract_parties[contract_name]: # loops through all parties of the contract and executes the transaction
+                        sender_wallet = self.wallets.get(sender)
+                        if sender_wallet is None or receiver_wallet is None: # returns an error if the contract could not be executed
+                            self.notify(f"Error. Smart Contract {contract_name} could not be executed for {sender}.")
+                        elif sender_wallet.balance < terms.amount: # checks if the sender has enough balance to execute the transaction
+                            self.notify("Insufficient balance. This is a breach of contract.")
+                        else: # executes the transaction
+                            sender_wallet.balance -= terms.amount
+                            receiver_wallet.balance += terms.amount
+                            payouts.append(ContractPayout(contract_name, sender, terms.receiver, terms.amount, Block.now()))
+                            balances.append({sender: sender_wallet.balance, terms.receiver: receiver_wallet.balance})
+                            self.notify(f"Smart Contract {contract_name} executed successfully.")
+                    self.write_blocks(payouts, balances) # records the payouts on the blockchain
+                    fired += 1
+                    if terms.executes_once: # funding contracts are finished once they paid out
+                        self.finish_contract(contract_name, "executed")
+                        self.journal("delete_contract", contract_name, "executed")
+                    pending += self.SCfunding_index.get(terms.receiver, []) # the payout may in turn reach the funding goal of other contracts
+
+        if metrics.enabled:
+            contract_duration.observe(time.perf_counter() - start)
+            if evaluated: # Rounds in which no contract was evaluated are not counted
+                contracts_evaluated.observe(len(evaluated))
+                contracts_fired.observe(fired)
+
+
+    # checks whether a contract exists and is still active
+    def is_active(self, contract_name):
+        return contract_name in self.SC and self.SC[contract_name].state == "active"
+
+
+    # function that deletes a contract if all parties agree or if the creator deletes it before any parties agreed to it
+    def delete_contract(self, contract_name, address):
+        if address != None: # if the address is specified, checks if the user is authenticated
+            if self.authenticate_user(address): # authenticates the user
+                if self.is_active(contract_name) and len(self.contract_parties[contract_name]) == 1: # deletes the contract if the contract exists and only one party is involved
+                    with self.contract_lock: # waits until the contracts being evaluated are done
+                        self.finish_contract(contract_name) # stops evaluating the contract
+                        self.journal("delete_contract", contract_name)
+                    return print(f"Contract {contract_name} deleted.")
+                elif self.is_active(contract_name) and len(self.contract_parties[contract_name]) > 1: # returns an error if the contract exists and more than one party is involved
+                    raise ValueError("Contract can only be deleted if all parties agree.") # party alone cannot delete the contract without consent of all parties
+                else: # returns an error if the contract does not exist
+                    raise ValueError("Error. Contract not found.")
+            else: # returns an error if the user is not authenticated
+                raise ValueError("Error. Please try again later.")
+
+        if address == None and self.is_active(contract_name): # deletes the contract if the creator deletes it before any parties agreed to it
+            with self.contract_lock: # waits until the contracts being evaluated are done
+                self.finish_contract(contract_name) # stops evaluating the contract
+                self.journal("delete_contract", contract_name)
+            return print(f"Contract {contract_name} deleted.")
+
+
+    # function that checks what the conditions of a contract are
+    def check_conditions(self, contract_name):
+        if contract_name in self.SC.keys(): # checks if the contract exists
+            contract = self.SC[contract_name]
+            conditions = self.conditions_to_coins(contract.conditions, contract.contract_type)
+            return print(f"Contract {contract_name} of type {contract.contract_type} ({contract.state}) has the following conditions: {conditions}.")
+        else: # returns an error if the contract does not exist
+            raise ValueError("Error. Contract not found.")
@@ -0,0 +1,212 @@
+# MACoin Blockchain - metrics
+# Call counts and latency histograms of the ledger hot paths, and gauges of the ledger sizes, exported in the Prometheus text format
+# --> Functions are instrumented with the timed decorator when their module is imported. With MACOIN_METRICS=0 the decorator returns the
+#     function itself, so switched off instrumentation costs nothing
+# --> Observations are counted in fixed buckets (found by bisection on the bucket bounds), in per-thread shards: recording a call takes
+#     no lock, well under a microsecond, and the memory used does not grow with the number of calls
+# --> Gauges (chain and wallet sizes) are read from callbacks when the metrics are exported, one series per blockchain (label chain)
+# --> The paths run for every transfer and block (transfer_funds, add_block, execute_contract, block sealing) observe their histograms inline,
+#     without the extra function call of the timed decorator, which is kept for coarser operations (a batch of transfers, a checkpoint, ...)
+# --> The metrics are written to a file with write() (e.g. for the textfile collector of the Prometheus node exporter),
+#     or served over HTTP on a local port with serve()
+#
+# Usage: MACOIN_METRICS=0 python MACoin.py                     (instrumentation off)
+#        metrics.serve(9108), then curl http://127.0.0.1:9108/metrics
+#        metrics.write("/var/lib/node_exporter/macoin.prom")
+
+import bisect
+import functools
+import http.server
+import os
+import threading
+import time
+
+# Bucket bounds of the latency histograms, in seconds (1 microsecond to 10 seconds)
+latency_buckets = (1e-6, 2.5e-6, 5e-6, 1e-5, 2.5e-5, 5e-5, 1e-4, 2.5e-4, 5e-4, 1e-3, 2.5e-3, 5e-3, 1e-2, 2.5e-2, 5e-2, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0)
+
+# Bucket bounds of the histograms of counts (e.g. contracts evaluated per block)
+count_buckets = (0, 1, 2, 5, 10, 20, 50, 100, 200, 500, 1000)
+
+
+
+############################################################################################
+###################################### Metric Types ########################################
+############################################################################################
+# Histogram with fixed buckets: counts[i] holds the observations up to bounds[i], the last count the observations above every bound
+# --> Every thread records into its own shard (bucket counts, then the sum of the observations), so recording takes no lock.
+#     The shards are added up when the histogram is exported
+class Histogram:
+    def __init__(self, bounds=latency_buckets):
+        self.bounds = tuple(bounds)
+        self.local = threading.local() # Shard of the current thread
+        self.shards = [] # Shards of every thread that recorded an observation
+        self.lock = threading.Lock() # Protects shards
+
+
+    # Shard of the current thread, created on its first observation
+    def new_shard(self):
+        shard = [0] * (len(self.bounds) + 2)
+        with self.lock:
+            self.shards.append(shard)
+        self.local.shard = shard
+        return shard
+
+
+    def observe(self, value):
+        try:
+            shard = self.local.shard
+        except AttributeError:
+            shard = self.new_shard()
+        shard[bisect.bisect_left(self.bounds, value)] += 1
+        shard[-1] += value
+
+
+    # Prometheus sample lines of the histogram: cumulative buckets, sum and count
+    def samples(self, name, labels):
+        with self.lock:
+            shards = list(self.shards)
+        totals = [sum(column) for column in zip(*shards)] if shards else [0] * (len(self.bounds) + 2)
+        lines = []
+        cumulative = 0
+        for bound, count in zip(self.bounds + (float("inf"),), totals):
+            cumulative += count
+            le = "+Inf" if bound == float("inf") else repr(float(bound))
+            lines.append(f"{name}_bucket{format_labels(labels + (('le', le),))} {cumulative}")
+        lines.append(f"{name}_sum{format_labels(labels)} {totals[-1]}")
+        lines.append(f"{name}_count{format_labels(labels)} {cumulative}")
+        return lines
+
+
+
+# Gauge read from a callback when the metrics are exported (a callback returning None is skipped)
+class Gauge:
+    def __init__(self, function):
+        self.function = function
+
+
+    def samples(self, name, labels):
+        value = self.function()
+        return [] if value is None else [f"{name}{format_labels(labels)} {value}"]
+
+
+
+# Prometheus label string, e.g. {function="transfer_funds"}
+def format_labels(labels):
+    if not labels:
+        return ""
+    escape = lambda value: str(value).replace("\\", "\\\\").replace("\"", "\\\"").replace("\n", "\\n")
+    return "{" + ",".join(f"{key}=\"{escape(value)}\"" for key, value in labels) + "}"
+
+
+
+############################################################################################
+###################################### Metrics Registry ####################################
+############################################################################################
+class Metrics:
+    # Initialize an empty registry; the functions decorated while the registry is disabled are not instrumented
+    def __init__(self, enabled=True):
+        self.enabled = enabled
+        self.families = {} # Metric name -> [type, help text, {labels: metric}]
+        self.lock = threading.Lock() # Protects families
+
+
+    # Metric of a family with the given labels (a tuple of (key, value) pairs), created on first use
+    def metric(self, kind, name, help_text, labels, create):
+        with self.lock:
+            family = self.families.setdefault(name, [kind, help_text, {}])
+            if labels not in family[2]:
+                family[2][labels] = create()
+            return family[2][labels]
+
+
+    def histogram(self, name, help_text, bounds=latency_buckets, labels=()):
+        return self.metric("histogram", name, help_text, labels, lambda: Histogram(bounds))
+
+
+    # Register (or replace) a gauge read from function()
+    def gauge(self, name, help_text, function, labels=()):
+        with self.lock:
+            self.families.setdefault(name, ["gauge", help_text, {}])[2][labels] = Gauge(function)
+
+
+    # Remove the metrics with the given labels from every family (e.g. the gauges of a blockchain that was garbage collected)
+    def remove(self, labels):
+        with self.lock:
+            for kind, help_text, metrics in self.families.values():
+                metrics.pop(labels, None)
+
+
+    # Decorator counting the calls of a function and their latency in macoin_call_duration_seconds{function=name}
+    # Exceptions are timed too. When the registry is disabled, the function is returned unchanged
+    def timed(self, name):
+        def decorate(function):
+            if not self.enabled:
+                return function
+            histogram = self.histogram("macoin_call_duration_seconds", "Latency of the instrumented ledger functions, in seconds",
+                                       labels=(("function", name),))
+            clock, local, bounds, bisect_left = time.perf_counter, histogram.local, histogram.bounds, bisect.bisect_left
+
+            @functools.wraps(function)
+            def timed_function(*args, **kwargs):
+                start = clock()
+                try:
+                    return function(*args, **kwargs)
+                finally: # Histogram.observe, inlined to save a call on every instrumented call
+                    elapsed = clock() - start
+                    try:
+                        shard = local.shard
+                    except AttributeError:
+                        shard = histogram.new_shard()
+                    shard[bisect_left(bounds, elapsed)] += 1
+                    shard[-1] += elapsed
+            return timed_function
+        return decorate
+
+
+    # All metrics in the Prometheus text exposition format
+    def render(self):
+        with self.lock:
+            families = [(name, kind, help_text, list(metrics.items())) for name, (kind, help_text, metrics) in sorted(self.families.items())]
+        lines = []
+        for name, kind, help_text, metrics in families:
+            lines.append(f"# HELP {name} {help_text}")
+            lines.append(f"# TYPE {name} {kind}")
+            for labels, metric in metrics:
+                lines.extend(metric.samples(name, labels))
+        return "\n".join(lines) + "\n"
+
+
+    # Write the metrics to a file, replaced atomically so a collector never reads a partial file
+    def write(self, path):
+        with open(path + ".tmp", "w") as f:
+            f.write(self.render())
+        os.replace(path + ".tmp", path)
+
+
+    # Serve the metrics over HTTP at /metrics, from a background thread; returns the server (call shutdown() to stop it)
+    def serve(self, port=9108, host="127.0.0.1"):
+        registry = self
+
+        class MetricsHandler(http.server.BaseHTTPRequestHandler):
+            def do_GET(self):
+                if self.path.split("?")[0] != "/metrics":
+                    self.send_error(404)
+                    return
+                body = registry.render().encode()
+                self.send_response(200)
+                self.send_header("Content-Type", "text/plain; version=0.0.4; charset=utf-8")
+                self.send_header("Content-Length", str(len(body)))
+                self.end_headers()
+                self.wfile.write(body)
+
+            def log_message(self, format, *args): # Scrapes are not logged
+                pass
+
+        server = http.server.ThreadingHTTPServer((host, port), MetricsHandler)
+        threading.Thread(target=server.serve_forever, name="macoin-metrics", daemon=True).start()
+        return server
+
+
+
+# Registry shared by the ledger, switched off with the MACOIN_METRICS environment variable (0, off or false) before the ledger is imported
+metrics = Metrics(enabled=os.environ.get("MACOIN_METRICS", "1").lower() not in ("0", "off", "false"))
@@ -0,0 +1,272 @@
+# MACoin Blockchain - price data
+# Sources and on-disk cache for the currency and cryptocurrency prices shown by display_crypto_price (see MACoin.py)
+# --> A price series is a list of [timestamp in milliseconds, price in CHF] points, as returned by CoinGecko's market_chart/range endpoint
+# --> Sources fetch the points of a time range: CoinGecko for cryptocurrencies and Yahoo Finance for currencies, or local fixtures when offline
+# --> The cache keeps the points fetched for every (currency, is_crypto) pair on disk, together with the time ranges they cover, so only the
+#     missing days are fetched. Entries younger than the TTL are served without any request, and the least recently used entries are evicted
+#     once the cache grows beyond max_bytes
+# --> CoinGecko returns 5-minute, hourly or daily points depending on the length of the requested range, so the points of every fetch are
+#     resampled to one point per day (the first of the day, stamped at midnight UTC) before they are merged into the cached series
+# --> Concurrent requests for the same pair are coalesced: one thread fetches, the others wait for it and are then served from the cache
+#
+# Usage: MACOIN_PRICE_SOURCE=local python MACoin.py               (synthetic prices, no network)
+#        MACOIN_PRICE_SOURCE=/path/to/fixtures python MACoin.py   (fixture files <currency>.json, synthetic prices for the others)
+#        MACOIN_PRICE_CACHE=/path/to/cache python MACoin.py       (cache directory, default ~/.cache/macoin/prices)
+
+import datetime
+import hashlib
+import json
+import math
+import os
+import random
+import re
+import threading
+import time
+
+day_ms = 86_400_000 # Milliseconds per day
+
+
+
+############################################################################################
+###################################### Price Sources #######################################
+############################################################################################
+# Every source fetches the [timestamp in milliseconds, price in CHF] points of a currency between start and end (milliseconds since 1970-01-01)
+
+# Cryptocurrency prices from CoinGecko
+class CoinGeckoSource:
+    base_url = "https://api.coingecko.com/api/v3"
+
+    def __init__(self, timeout=10):
+        self.timeout = timeout # Seconds before a request is abandoned
+
+
+    def fetch(self, currency, start, end):
+        import requests
+        params = {'vs_currency': 'chf', 'from': str(start // 1000), 'to': str(end // 1000)}
+        response = requests.get(f"{self.base_url}/coins/{currency}/market_chart/range", params=params, timeout=self.timeout)
+        response.raise_for_status()
+        return [[int(timestamp), price] for timestamp, price in response.json().get('prices', [])]
+
+
+
+# Exchange rates of currencies against CHF from Yahoo Finance
+class YahooSource:
+    def __init__(self, timeout=10):
+        self.timeout = timeout # Seconds before a request is abandoned
+
+
+    def fetch(self, currency, start, end):
+        import yfinance as yf
+        start_date = datetime.datetime.fromtimestamp(start / 1000, datetime.timezone.utc).date()
+        end_date = datetime.datetime.fromtimestamp(end / 1000, datetime.timezone.utc).date() + datetime.timedelta(days=1) # Yahoo's end date is exclusive
+        data = yf.download(f"{currency}CHF=X", start=start_date, end=end_date, progress=False, timeout=self.timeout)
+        close = data['Close']
+        if getattr(close, 'ndim', 1) > 1: # Recent versions of yfinance return one column per ticker
+            close = close.iloc[:, 0]
+        return [[int(date.timestamp() * 1000), float(value)] for date, value in close.items() if value == value] # Skips missing values (NaN)
+
+
+
+# Network source used by default: CoinGecko for cryptocurrencies, Yahoo Finance for currencies
+class MarketSource:
+    name = "market"
+
+    def __init__(self, timeout=10):
+        self.crypto = CoinGeckoSource(timeout)
+        self.currencies = YahooSource(timeout)
+
+
+    def fetch(self, currency, is_crypto, start, end):
+        return (self.crypto if is_crypto else self.currencies).fetch(currency, start, end)
+
+
+
+# Local source serving fixtures, so the price pipeline runs (and can be tested) without network access
+# Fixture files are named <currency>.json in the fixture directory and hold {"prices": [[timestamp in milliseconds, price], ...]}
+# Currencies without a fixture get a synthetic daily series, which only depends on the currency and the day (so every range is consistent)
+class LocalPriceSource:
+    name = "local"
+
+    def __init__(self, directory=None):
+        self.directory = directory
+        self.fixtures = {} # Currency -> points of its fixture file, loaded on first use
+
+
+    # Points of the fixture file of a currency, or None if it has no fixture
+    def fixture(self, currency):
+        if currency not in self.fixtures:
+            path = os.path.join(self.directory, f"{currency.lower()}.json") if self.directory else None
+            if path and os.path.exists(path):
+                with open(path) as f:
+                    self.fixtures[currency] = sorted([int(timestamp), price] for timestamp, price in json.load(f)['prices'])
+            else:
+                self.fixtures[currency] = None
+        return self.fixtures[currency]
+
+
+    # Synthetic price of a currency on a day (days since 1970-01-01): slow and fast cycles around a base price, plus daily noise
+    @staticmethod
+    def synthetic_price(currency, is_crypto, day):
+        seed = int.from_bytes(hashlib.sha256(f"{currency}:{is_crypto}".encode()).digest()[:8], "big")
+        base = 10 ** (seed % 5 + 2) if is_crypto else 0.5 + (seed % 100) / 100 # CHF per coin, or CHF per unit of currency
+        noise = random.Random(seed + day).gauss(0, 0.01 if is_crypto else 0.002)
+        cycles = 0.2 * math.sin(day / 90 + seed % 7) + 0.05 * math.sin(day / 7 + seed % 3) if is_crypto else 0.03 * math.sin(day / 60 + seed % 5)
+        return base * math.exp(cycles + noise)
+
+
+    def fetch(self, currency, is_crypto, start, end):
+        fixture = self.fixture(currency)
+        if fixture is not None:
+            return [point for point in fixture if start <= point[0] <= end]
+        return [[day * day_ms, self.synthetic_price(currency, is_crypto, day)] for day in range(-(-start // day_ms), end // day_ms + 1)]
+
+
+
+############################################################################################
+####################################### Price Cache ########################################
+############################################################################################
+class PriceCache:
+    # Initialize the cache in a directory (one subdirectory per source), with a time to live in seconds and a maximum size in bytes
+    def __init__(self, source=None, directory=None, ttl=3600, max_bytes=16 * 1024 * 1024):
+        self.source = source if source is not None else MarketSource()
+        directory = directory or os.environ.get("MACOIN_PRICE_CACHE") or os.path.join(os.path.expanduser("~"), ".cache", "macoin", "prices")
+        self.directory = os.path.join(directory, getattr(self.source, "name", type(self.source).__name__))
+        os.makedirs(self.directory, exist_ok=True)
+        self.ttl = ttl
+        self.max_bytes = max_bytes
+        self.lock = threading.Lock() # Protects pair_locks
+        self.pair_locks = {} # (currency, is_crypto) -> lock held while the pair is fetched
+        self.fetches = 0 # Number of requests sent to the source
+
+
+    # One point per day (days since 1970-01-01): the first point of every day, stamped at midnight UTC, like the daily points of CoinGecko
+    @staticmethod
+    def daily_points(points):
+        days = {}
+        for timestamp, price in sorted(points):
+            days.setdefault(timestamp // day_ms, price)
+        return [[day * day_ms, price] for day, price in sorted(days.items())]
+
+
+    # Path of the cache entry of a pair
+    def entry_path(self, currency, is_crypto):
+        name = re.sub(r"[^A-Za-z0-9_-]", "_", currency)
+        return os.path.join(self.directory, f"{'crypto' if is_crypto else 'currency'}_{name}.json")
+
+
+    # Lock of a pair, created on first use
+    def pair_lock(self, currency, is_crypto):
+        with self.lock:
+            return self.pair_locks.setdefault((currency, is_crypto), threading.Lock())
+
+
+    # Read a cache entry (None if missing or unreadable), and mark it as recently used
+    def load(self, path):
+        try:
+            with open(path) as f:
+                entry = json.load(f)
+        except (OSError, ValueError):
+            return None
+        os.utime(path)
+        return entry
+
+
+    # Write a cache entry, then evict the least recently used entries beyond max_bytes
+    def save(self, path, entry):
+        with open(path + ".tmp", "w") as f: # Write to a temporary file first, so a crash never leaves a partial entry
+            json.dump(entry, f, separators=(",", ":"))
+        os.replace(path + ".tmp", path)
+        self.evict(keep=path)
+
+
+    # Remove the least recently used entries until the cache fits in max_bytes (the entry just written is kept)
+    def evict(self, keep=None):
+        entries = []
+        for name in os.listdir(self.directory):
+            path = os.path.join(self.directory, name)
+            if name.endswith(".json") and path != keep:
+                status = os.stat(path)
+                entries.append((status.st_mtime, status.st_size, path))
+        size = sum(entry[1] for entry in entries) + (os.path.getsize(keep) if keep else 0)
+        for mtime, entry_size, path in sorted(entries):
+            if size <= self.max_bytes:
+                break
+            os.remove(path)
+            size -= entry_size
+
+
+    # Time ranges between start and end not covered by the given (sorted, disjoint) ranges
+    @staticmethod
+    def missing_ranges(covered, start, end):
+        missing = []
+        for covered_start, covered_end in covered:
+            if covered_end <= start:
+                continue
+            if covered_start >= end:
+                break
+            if covered_start > start:
+                missing.append([start, covered_start])
+            start = max(start, covered_end)
+        if start < end:
+            missing.append([start, end])
+        return missing
+
+
+    # Add a time range to the given ranges, merging overlapping and adjacent ranges
+    @staticmethod
+    def add_range(covered, start, end):
+        merged = []
+        for covered_start, covered_end in sorted(covered + [[start, end]]):
+            if merged and covered_start <= merged[-1][1]:
+                merged[-1][1] = max(merged[-1][1], covered_end)
+            else:
+                merged.append([covered_start, covered_end])
+        return merged
+
+
+    # Price points of a pair between start and end (milliseconds since 1970-01-01), fetching only the days missing from the cache
+    def get(self, currency, is_crypto, start, end):
+        with self.pair_lock(currency, is_crypto): # Concurrent requests for the pair wait here, and find the points fetched by the first one
+            path = self.entry_path(currency, is_crypto)
+            entry = self.load(path)
+            if entry is None or entry.get("resolution") != day_ms: # Entries written before the points were resampled are fetched again
+                entry = {"currency": currency, "is_crypto": is_crypto, "resolution": day_ms, "covered": [], "fetched_at": 0, "prices": []}
+            now = int(time.time() * 1000)
+            request_end = min(end, now) # Later points do not exist yet
+            fresh = entry["covered"] and now - entry["fetched_at"] < self.ttl * 1000
+            if fresh and entry["covered"][-1][1] >= start: # Fresh entry overlapping the range: the points since the last fetch are not requested
+                request_end = min(request_end, entry["covered"][-1][1])
+            for missing_start, missing_end in self.missing_ranges(entry["covered"], start, request_end):
+                missing_start -= missing_start % day_ms # Whole days are fetched
+                points = self.daily_points(self.source.fetch(currency, is_crypto, missing_start, missing_end))
+                self.fetches += 1
+                prices = [point for point in entry["prices"] if not missing_start <= point[0] <= missing_end] + [list(point) for point in points]
+                entry["prices"] = sorted(prices)
+                entry["covered"] = self.add_range(entry["covered"], missing_start, missing_end)
+                entry["fetched_at"] = now
+                self.save(path, entry)
+            return [point for point in entry["prices"] if start <= point[0] <= end]
+
+
+
+# Source selected by the MACOIN_PRICE_SOURCE environment variable: 'local' for synthetic prices, a directory for fixtures, the network otherwise
+def source_from_environment():
+    setting = os.environ.get("MACOIN_PRICE_SOURCE", "")
+    if setting == "local":
+        return LocalPriceSource()
+    if setting:
+        return LocalPriceSource(setting)
+    return MarketSource()
+
+
+default_cache = None # Cache shared by the price functions, created on first use
+default_cache_lock = threading.Lock()
+
+
+# Cache shared by the price functions, for the source selected by the environment
+def get_price_cache():
+    global default_cache
+    with default_cache_lock:
+        if default_cache is None:
+            default_cache = PriceCache(source_from_environment())
+        return default_cache
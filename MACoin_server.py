@@ -0,0 +1,290 @@
+# MACoin Blockchain - network front-end
+# asyncio server exposing one Blockchain to many clients over a local TCP or Unix socket, speaking JSON lines
+# --> Every request is one JSON object per line: {"id": 1, "op": "transfer", "args": {...}}
+#     Every response is one JSON object per line: {"id": 1, "ok": true, "result": ...} or {"id": 1, "ok": false, "error": "..."}
+# --> Reads (balances, wallet histories, contracts) are answered directly by the connection handlers, concurrently
+# --> Mutations (transfers, wallets, contracts) are put on a single command queue and applied to the Blockchain in order by one writer task,
+#     which runs them on a dedicated writer thread so that mining, disk writes and contract evaluation never block the event loop
+# --> The served blockchain is quiet (see Blockchain.notify): its operations are answered to the clients rather than printed
+#
+# Usage: python MACoin_server.py --port 8765            (TCP on localhost)
+#        python MACoin_server.py --unix /tmp/macoin.sock  (Unix socket)
+#        python MACoin_server.py --metrics-port 9108       (metrics in the Prometheus text format at http://127.0.0.1:9108/metrics)
+
+import argparse
+import asyncio
+import functools
+import itertools
+import json
+from concurrent.futures import ThreadPoolExecutor
+
+from MACoin_core import Blockchain
+from MACoin_metrics import metrics
+
+
+# Raised for requests that cannot be served (unknown operation, missing password, ...)
+class RequestError(Exception):
+    pass
+
+
+class LedgerServer:
+    # Initialize the server for a blockchain (by default a new quiet one, which does not print its operations); with testing=True,
+    # passwords are not checked (as in the testing interface)
+    def __init__(self, blockchain=None, testing=False, history_limit=100):
+        self.blockchain = blockchain if blockchain is not None else Blockchain(quiet=True)
+        self.testing = testing
+        self.history_limit = history_limit # Default number of transactions returned by 'history'
+        self.commands = None # Queue of pending mutations, created in start()
+        self.writer_task = None
+        self.writer_thread = None # Single thread applying the mutations, created in start()
+        self.servers = []
+        self.clients = 0 # Number of connected clients
+
+        # Operations answered directly (reads) and operations applied by the writer task (mutations)
+        self.reads = {"balance": self.balance, "history": self.history, "contract": self.contract, "status": self.status}
+        self.mutations = {"create_wallet": self.create_wallet, "transfer": self.transfer, "transfer_many": self.transfer_many,
+                          "create_contract": self.create_contract, "sign_contract": self.sign_contract}
+
+
+    #######################
+    ### READ OPERATIONS ###
+    #######################
+    # Balance and available balance (net of pending transfers) of a wallet
+    def balance(self, address):
+        return {"balance": self.blockchain.get_wallet_balance(address), "available": self.blockchain.get_available_balance(address)}
+
+
+    # Transaction history of a wallet, most recent first
+    def history(self, address, limit=None):
+        if address not in self.blockchain.wallets:
+            raise ValueError("Error. Wallet not found.")
+        transactions = self.blockchain.iter_wallet_transactions(address)
+        return list(itertools.islice(transactions, limit or self.history_limit))
+
+
+    # Type, state, conditions and parties of a smart contract
+    def contract(self, contract_name):
+        if contract_name not in self.blockchain.SC:
+            raise ValueError("Error. Contract not found.")
+        contract = self.blockchain.SC[contract_name]
+        return {"type": contract.contract_type, "state": contract.state,
+                "conditions": self.blockchain.conditions_to_coins(contract.conditions, contract.contract_type),
+                "parties": self.blockchain.contract_parties[contract_name]}
+
+
+    # Size of the ledger and of the server's queues
+    def status(self):
+        return {"blocks": len(self.blockchain.chain), "wallets": len(self.blockchain.wallets), "contracts": len(self.blockchain.SC),
+                "pending_transactions": len(self.blockchain.mempool), "queued_commands": self.commands.qsize(), "clients": self.clients}
+
+
+    ########################
+    ### WRITE OPERATIONS ###
+    ########################
+    # Check the password of a wallet unless the server runs in testing mode
+    def authenticate(self, address, password):
+        if self.testing:
+            return
+        if not password: # The blockchain would otherwise prompt for the password
+            raise RequestError("Error. Password required.")
+        if address not in self.blockchain.wallets:
+            raise ValueError("Error. Wallet not found.")
+        self.blockchain.authenticate_user(address, password)
+
+
+    # Create a wallet protected by the given password, returns its address and recovery phrase
+    def create_wallet(self, password=None):
+        if not password and not self.testing:
+            raise RequestError("Error. Password required.")
+        address = self.blockchain.create_wallet(testing=True, password=password or None) # Registered and journaled with its password
+        return {"address": address, "phrase": self.blockchain.wallets[address].phrase}
+
+
+    # Transfer funds between two wallets
+    def transfer(self, sender, receiver, amount, data="", password=None):
+        self.authenticate(sender, password)
+        self.blockchain.transfer_funds(sender, receiver, amount, data, testing=True)
+        return {"blocks": len(self.blockchain.chain)}
+
+
+    # Settle a batch of transfers atomically, as lists of [sender, receiver, amount, data]
+    def transfer_many(self, transfers, passwords=None):
+        passwords = passwords or {}
+        for sender in dict.fromkeys(transfer[0] for transfer in transfers):
+            self.authenticate(sender, passwords.get(sender))
+        return {"settled": self.blockchain.transfer_many([tuple(transfer) for transfer in transfers], testing=True)}
+
+
+    # Create a smart contract of type funding, transaction or other
+    def create_contract(self, address, conditions, contract_type, password=None):
+        self.authenticate(address, password)
+        contract_names = set(self.blockchain.SC)
+        self.blockchain.create_SC(address, conditions, contract_type, testing=True)
+        created = set(self.blockchain.SC) - contract_names
+        return {"contract_name": created.pop() if created else None}
+
+
+    # Sign an existing smart contract
+    def sign_contract(self, address, contract_name, password=None):
+        self.authenticate(address, password)
+        self.blockchain.add_party_SC(address, contract_name, testing=True)
+        return {"parties": self.blockchain.contract_parties[contract_name]}
+
+
+    ##############
+    ### SERVER ###
+    ##############
+    # Single writer: applies the queued mutations to the blockchain one after the other, in the order they were received
+    # Each mutation runs on the writer thread, and the next one starts only when it is done, so the event loop keeps serving reads meanwhile
+    async def writer(self):
+        loop = asyncio.get_running_loop()
+        while True:
+            operation, args, result = await self.commands.get()
+            try:
+                outcome = await loop.run_in_executor(self.writer_thread, functools.partial(operation, **args))
+                if not result.cancelled():
+                    result.set_result(outcome)
+            except Exception as e:
+                if not result.cancelled():
+                    result.set_exception(e)
+            self.commands.task_done()
+
+
+    # Serve one request: reads are answered directly, mutations wait for the writer task
+    async def serve_request(self, request):
+        op, args = request.get("op"), request.get("args") or {}
+        if not isinstance(args, dict):
+            raise RequestError("Error. The arguments of a request must be a JSON object.")
+        if op in self.reads:
+            return self.reads[op](**args)
+        if op in self.mutations:
+            result = asyncio.get_running_loop().create_future()
+            await self.commands.put((self.mutations[op], args, result))
+            return await result
+        raise RequestError(f"Error. Unknown operation '{op}'.")
+
+
+    # Handle one client connection: one JSON request per line, one JSON response per line
+    async def handle_client(self, reader, writer):
+        self.clients += 1
+        try:
+            while True:
+                line = await reader.readline()
+                if not line: # Client disconnected
+                    break
+                request_id = None
+                try:
+                    request = json.loads(line)
+                    if not isinstance(request, dict):
+                        raise RequestError("Error. A request must be a JSON object.")
+                    request_id = request.get("id")
+                    response = {"id": request_id, "ok": True, "result": await self.serve_request(request)}
+                except Exception as e: # Invalid requests and ledger errors are returned to the client, and the connection stays open
+                    response = {"id": request_id, "ok": False, "error": str(e) or type(e).__name__}
+                writer.write(json.dumps(response, default=str).encode() + b"\n")
+                await writer.drain()
+        except ConnectionError: # Client went away while we were answering
+            pass
+        finally:
+            self.clients -= 1
+            writer.close()
+
+
+    # Start listening on a TCP port and/or a Unix socket, and start the writer task
+    async def start(self, host="127.0.0.1", port=8765, unix_path=None):
+        self.commands = asyncio.Queue()
+        self.writer_thread = ThreadPoolExecutor(max_workers=1, thread_name_prefix="macoin-writer")
+        self.writer_task = asyncio.create_task(self.writer())
+        if unix_path:
+            self.servers.append(await asyncio.start_unix_server(self.handle_client, path=unix_path, limit=2 ** 24))
+        if port is not None:
+            self.servers.append(await asyncio.start_server(self.handle_client, host, port, limit=2 ** 24, backlog=4096))
+
+
+    # Serve until cancelled
+    async def serve_forever(self):
+        await asyncio.gather(*(server.serve_forever() for server in self.servers))
+
+
+    # Stop listening, let the writer apply the queued mutations, and stop the writer task
+    async def stop(self):
+        for server in self.servers:
+            server.close()
+            await server.wait_closed()
+        self.servers = []
+        await self.commands.join()
+        self.writer_task.cancel()
+        self.writer_thread.shutdown()
+
+
+# Minimal client for the JSON lines protocol
+class LedgerClient:
+    def __init__(self, reader, writer):
+        self.reader = reader
+        self.writer = writer
+        self.ids = itertools.count(1)
+
+
+    # Connect to a server over TCP, or over a Unix socket if unix_path is given
+    @classmethod
+    async def connect(cls, host="127.0.0.1", port=8765, unix_path=None):
+        if unix_path:
+            reader, writer = await asyncio.open_unix_connection(unix_path, limit=2 ** 24)
+        else:
+            reader, writer = await asyncio.open_connection(host, port, limit=2 ** 24)
+        return cls(reader, writer)
+
+
+    # Send a request and wait for its response; raises ValueError with the server's message if the request failed
+    async def request(self, op, **args):
+        request_id = next(self.ids)
+        self.writer.write(json.dumps({"id": request_id, "op": op, "args": args}).encode() + b"\n")
+        await self.writer.drain()
+        response = json.loads(await self.reader.readline())
+        if not response["ok"]:
+            raise ValueError(response["error"])
+        return response["result"]
+
+
+    # Close the connection
+    async def close(self):
+        self.writer.close()
+        await self.writer.wait_closed()
+
+
+# Run a server from the command line
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Serve a MACoin blockchain over a local socket (JSON lines).")
+    parser.add_argument("--host", default="127.0.0.1")
+    parser.add_argument("--port", type=int, default=8765)
+    parser.add_argument("--unix", default=None, help="path of a Unix socket to listen on instead of TCP")
+    parser.add_argument("--store", default=None, help="directory of an on-disk block store")
+    parser.add_argument("--batching", action="store_true", help="pack transfers into multi-transaction blocks")
+    parser.add_argument("--testing", action="store_true", help="do not check passwords (testing wallets)")
+    parser.add_argument("--metrics-port", type=int, default=None, help="serve the metrics at http://127.0.0.1:<port>/metrics")
+    args = parser.parse_args(argv)
+
+    blockchain = Blockchain(batching=args.batching, store_path=args.store, quiet=True)
+    server = LedgerServer(blockchain, testing=args.testing)
+    if args.metrics_port:
+        metrics.serve(args.metrics_port)
+
+    async def run():
+        await server.start(args.host, None if args.unix else args.port, args.unix)
+        print(f"Serving MACoin on {args.unix or f'{args.host}:{args.port}'}.")
+        try:
+            await server.serve_forever()
+        finally:
+            await server.stop()
+
+    try:
+        asyncio.run(run())
+    except KeyboardInterrupt:
+        print("Server stopped.")
+    finally:
+        blockchain.flush_mempool()
+        blockchain.close()
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,356 @@
+# MACoin Blockchain - tests
+# Behaviour of the ledger under concurrency, chain replay and tampering, and of the network front-end
+# --> Every test works on a scratch blockchain (in memory, or in a temporary directory when persistence is tested)
+#
+# Usage: python -m pytest test_MACoin.py
+#        python -m unittest test_MACoin
+
+import asyncio
+import contextlib
+import importlib.util
+import io
+import json
+import re
+import secrets
+import sys
+import tempfile
+import threading
+import time
+import unittest
+from unittest import mock
+from concurrent.futures import ThreadPoolExecutor
+
+from MACoin_core import Transfer, ContractPayout, Block, Blockchain
+from MACoin_server import LedgerServer, LedgerClient
+from MACoin_metrics import metrics
+from MACoin_prices import LocalPriceSource, PriceCache, day_ms
+
+
+# Run a function with the messages printed by the ledger discarded (it prints a line for every operation)
+def quietly(function, *args, **kwargs):
+    with contextlib.redirect_stdout(io.StringIO()):
+        return function(*args, **kwargs)
+
+
+
+############################################################################################
+###################################### Concurrency #########################################
+############################################################################################
+class ConcurrentTransferTest(unittest.TestCase):
+    # Random transfers submitted from many threads at once, next to a reader of the analytics tables:
+    # the total supply is conserved, the chain stays valid and every transfer on the chain is indexed in the ledger
+    def test_total_supply_is_conserved(self, number=1000, threads=16):
+        blockchain = Blockchain()
+        quietly(blockchain.create_wallets, 10)
+        addresses = list(blockchain.wallets)
+        total_supply = blockchain.total_supply()
+        height, rows = len(blockchain.chain), len(blockchain.ledger)
+        random = secrets.SystemRandom()
+
+        def transfer(i): # one random transaction, returns whether it was settled
+            sender, receiver = random.sample(addresses, 2)
+            try:
+                blockchain.transfer_funds(sender, receiver, secrets.randbelow(10) + 1, f"Stress test {i+1}", testing=True)
+                return True
+            except ValueError: # other threads may have spent the sender's balance in the meantime
+                return False
+
+        done = threading.Event()
+        def read(): # reads the analytics tables while the transactions are added, returns the number of reads
+            reads = 0
+            while not done.is_set():
+                blockchain.get_all_transactions()
+                blockchain.get_wallets_overview()
+                blockchain.get_wallet_transactions(random.choice(addresses))
+                reads += 1
+            return reads
+
+        with contextlib.redirect_stdout(io.StringIO()), ThreadPoolExecutor(max_workers=threads + 1) as pool:
+            reader = pool.submit(read) if importlib.util.find_spec("pandas") else None # the analytics need pandas
+            settled = sum(pool.map(transfer, range(number)))
+            done.set()
+            if reader:
+                reader.result() # re-raises the errors of the reader
+            blockchain.flush_mempool()
+
+        self.assertGreater(settled, 0)
+        self.assertEqual(blockchain.total_supply(), total_supply)
+        self.assertIsNone(blockchain.verify_chain())
+        transfers = sum(transaction.tag in (Transfer.tag, ContractPayout.tag)
+                        for index in range(height, len(blockchain.chain)) for transaction in blockchain.chain[index].transactions)
+        self.assertEqual(len(blockchain.ledger) - rows, transfers)
+
+
+
+############################################################################################
+####################################### Batching ###########################################
+############################################################################################
+class BatchingTest(unittest.TestCase):
+    # A pending transfer whose receiver is deleted before the block is produced is dropped, and the sender keeps its funds
+    def test_receiver_deleted_while_pending(self):
+        blockchain = Blockchain(batching=True, max_block_interval=60_000)
+        self.addCleanup(blockchain.close)
+        with contextlib.redirect_stdout(io.StringIO()):
+            (sender, _), = blockchain.create_wallets(1)
+            receiver = blockchain.create_wallet(password="receiver")
+            balance = blockchain.wallets[sender].balance
+            blockchain.transfer_funds(sender, receiver, 10, "Pending", testing=True)
+            with mock.patch("builtins.input", side_effect=["receiver", "yes"]):
+                blockchain.delete_wallet(receiver)
+            blockchain.flush_mempool()
+        self.assertEqual(blockchain.wallets[sender].balance, balance)
+        self.assertEqual(blockchain.mempool, [])
+        self.assertEqual(blockchain.check_state()["balances"], {})
+
+
+
+############################################################################################
+######################################## Replay ############################################
+############################################################################################
+class ReplayTest(unittest.TestCase):
+    # Replaying the chain yields the live balances and contract parties
+    def test_replay_matches_live_state(self):
+        blockchain = Blockchain()
+        with contextlib.redirect_stdout(io.StringIO()):
+            (first, _), (second, _), (third, _) = blockchain.create_wallets(3)
+            blockchain.create_SC(first, ["When wallet ", second, " reaches ", 150, ", then send ", 5, " to ", third], "funding", testing=True)
+            blockchain.transfer_many([(first, second, 5, "Replay"), (second, third, 2, "Replay")], testing=True)
+            blockchain.transfer_funds(third, first, 1, "Replay", testing=True)
+        report = blockchain.check_state()
+        self.assertEqual(report["balances"], {})
+        self.assertEqual(report["parties"], {})
+        self.assertEqual(report["blocks"], len(blockchain.chain))
+
+
+    # A balance changed outside the chain is reported as a divergence
+    def test_replay_reports_divergence(self):
+        blockchain = Blockchain()
+        (address, _), = quietly(blockchain.create_wallets, 1)
+        blockchain.wallets[address].balance += 1
+        report = blockchain.check_state()
+        self.assertEqual(list(report["balances"]), [address])
+
+
+
+############################################################################################
+####################################### Tampering ##########################################
+############################################################################################
+class TamperingTest(unittest.TestCase):
+    # The chain validation rejects a forged chain, and the untouched chain is valid
+    def assertRejected(self, ledger, chain):
+        self.assertIsNone(ledger.verify_chain())
+        original_chain, ledger.chain = ledger.chain, chain
+        try:
+            self.assertIsNotNone(ledger.verify_chain())
+        finally:
+            ledger.chain = original_chain
+
+
+    # The parallel validation (worker processes on ranges of the chain, in memory or read from the block store) reports the first forged block
+    def test_parallel_validation(self):
+        with tempfile.TemporaryDirectory() as store_path:
+            for blockchain in (Blockchain(quiet=True), Blockchain(store_path=store_path, checkpoint_interval=0, quiet=True)):
+                (sender, _), (receiver, _) = blockchain.create_wallets(2)
+                for i in range(40):
+                    blockchain.transfer_funds(sender, receiver, 1, "Parallel check", testing=True)
+                self.assertIsNone(blockchain.verify_chain_parallel(2, 10))
+                if not blockchain.store_path:
+                    forged = blockchain.chain[:25] + [Block.from_bytes(bytes(blockchain.chain[26]))] + blockchain.chain[26:]
+                    original_chain, blockchain.chain = blockchain.chain, forged
+                    self.assertEqual(blockchain.verify_chain_parallel(2, 10), 25)
+                    self.assertEqual(blockchain.verify_chain(), 25)
+                    blockchain.chain = original_chain
+                blockchain.close()
+
+
+    # The last transaction of a block repeated, with the transaction count bumped, must not keep the Merkle root and the block hash
+    def test_repeated_last_transaction(self):
+        blockchain = Blockchain()
+        with contextlib.redirect_stdout(io.StringIO()):
+            sender, receiver = blockchain.create_wallets(2)[0][0], blockchain.create_wallets(1)[0][0]
+            blockchain.transfer_many([(sender, receiver, 1, "Tamper check")] * 3, testing=True) # one block holding 3 transfers (odd Merkle level)
+        block = blockchain.chain[-1]
+        forged = bytearray(block)
+        Block.count_format.pack_into(forged, block.hash_offset() + 32, len(block.encoded_transactions()) + 1)
+        forged += block.encoded_transactions()[-1]
+        self.assertRejected(blockchain, blockchain.chain[:-1] + [Block.from_bytes(forged)])
+
+
+    # The last mined block rewritten at difficulty 0 (its hash meets the difficulty it carries), and at a difficulty below the schedule
+    def test_rewritten_difficulty(self):
+        mined = Blockchain(proof_of_work=True, difficulty=8, min_difficulty=4, retarget_interval=4, mining_workers=1) # cheap proof of work chain
+        self.addCleanup(mined.miner.close)
+        with contextlib.redirect_stdout(io.StringIO()):
+            miner, receiver = mined.create_wallets(1)[0][0], mined.create_wallets(1)[0][0]
+            for i in range(5):
+                mined.transfer_funds(miner, receiver, 1, "Tamper check", testing=True)
+        block = mined.chain[-1]
+        rewrite = lambda difficulty: mined.miner.mine(Block(block.timestamp, block.data, block.previous_hash, block.transactions, difficulty=difficulty))
+        self.assertRejected(mined, mined.chain[:-1] + [rewrite(0)])
+        self.assertRejected(mined, mined.chain[:-1] + [rewrite(block.difficulty - 1)])
+
+
+
+############################################################################################
+####################################### Metrics ############################################
+############################################################################################
+@unittest.skipUnless(metrics.enabled, "metrics are switched off (MACOIN_METRICS=0)")
+class MetricsTest(unittest.TestCase):
+    # Number of calls of a function recorded in macoin_call_duration_seconds
+    @staticmethod
+    def calls(function):
+        match = re.search(rf'^macoin_call_duration_seconds_count{{function="{function}"}} (\d+)$', metrics.render(), re.M)
+        return int(match.group(1)) if match else 0
+
+
+    # Every transfer, including a rejected one, is counted, and so are the blocks it adds and the contract evaluation rounds it runs
+    def test_hot_paths_are_counted(self):
+        blockchain = Blockchain()
+        with contextlib.redirect_stdout(io.StringIO()):
+            (sender, _), (receiver, _) = blockchain.create_wallets(2)
+            before = {function: self.calls(function) for function in ("transfer_funds", "add_block", "execute_contract")}
+            blockchain.transfer_funds(sender, receiver, 1, "Metrics", testing=True)
+            with self.assertRaises(ValueError):
+                blockchain.transfer_funds(sender, receiver, 0, "Metrics", testing=True)
+        self.assertEqual(self.calls("transfer_funds") - before["transfer_funds"], 2)
+        self.assertEqual(self.calls("add_block") - before["add_block"], 1)
+        self.assertEqual(self.calls("execute_contract") - before["execute_contract"], 1)
+
+
+
+############################################################################################
+######################################## Prices ############################################
+############################################################################################
+class PriceCacheTest(unittest.TestCase):
+    def setUp(self):
+        directory = tempfile.TemporaryDirectory()
+        self.addCleanup(directory.cleanup)
+        self.cache = PriceCache(LocalPriceSource(), directory.name)
+
+
+    # A range after the data of a fresh entry is fetched, not answered with an empty series
+    def test_range_after_fresh_entry(self):
+        today = int(time.time() * 1000) // day_ms * day_ms
+        self.cache.get("bitcoin", True, today - 30 * day_ms, today - 20 * day_ms)
+        prices = self.cache.get("bitcoin", True, today - 10 * day_ms, today - day_ms)
+        self.assertEqual(len(prices), 10)
+        self.assertEqual(self.cache.fetches, 2)
+
+
+    # A range already covered by a fresh entry is served without a request
+    def test_covered_range_is_not_fetched(self):
+        today = int(time.time() * 1000) // day_ms * day_ms
+        self.cache.get("bitcoin", True, today - 30 * day_ms, today - day_ms)
+        prices = self.cache.get("bitcoin", True, today - 20 * day_ms, today - 10 * day_ms)
+        self.assertEqual(len(prices), 11)
+        self.assertEqual(self.cache.fetches, 1)
+
+
+
+############################################################################################
+######################################## Server ############################################
+############################################################################################
+class ServerTest(unittest.TestCase):
+    # Server on a scratch port and a client connected to it
+    async def connect(self, blockchain, testing=True, server_class=LedgerServer):
+        server = server_class(blockchain, testing=testing)
+        await server.start(port=0)
+        client = await LedgerClient.connect(*server.servers[0].sockets[0].getsockname()[:2])
+        return server, client
+
+
+    # Malformed requests get an error response and the connection keeps serving
+    def test_malformed_requests(self):
+        malformed = [b"not json", b"[1, 2]", b'"transfer"', b'{"id": 1, "op": "transfer", "args": [1]}', b'{"id": 2, "op": "unknown"}',
+                     b'{"id": 3, "op": "transfer_many", "args": {"transfers": [[]]}}', b'{"id": 4, "op": "balance", "args": {"wallet": "x"}}',
+                     b'{"id": 5, "op": "create_contract", "args": {"address": "x", "conditions": ["When wallet ", "x"], "contract_type": "funding"}}']
+
+        async def run():
+            server, client = await self.connect(Blockchain())
+            responses = []
+            for line in malformed:
+                client.writer.write(line + b"\n")
+                await client.writer.drain()
+                responses.append(json.loads(await client.reader.readline()))
+            sender = (await client.request("create_wallet"))["address"]
+            receiver = (await client.request("create_wallet"))["address"]
+            await client.request("transfer", sender=sender, receiver=receiver, amount=1)
+            balance = (await client.request("balance", address=receiver))["balance"]
+            await client.close()
+            await server.stop()
+            return responses, balance
+
+        responses, balance = quietly(asyncio.run, run())
+        self.assertFalse(any(response["ok"] for response in responses))
+        self.assertTrue(responses[-1]["error"].startswith("Error. The conditions")) # truncated conditions are rejected as such, not by an IndexError
+        self.assertEqual(balance, 101)
+
+
+    # Mutations run on the writer thread without redirecting the standard output of the process, and a quiet blockchain prints nothing
+    def test_mutations_keep_standard_output(self):
+        class ProbingServer(LedgerServer):
+            def __init__(self, *args, **kwargs):
+                super().__init__(*args, **kwargs)
+                self.mutations["probe"] = lambda: {"stdout": id(sys.stdout)}
+
+        async def run():
+            server, client = await self.connect(Blockchain(quiet=True), server_class=ProbingServer)
+            sender = (await client.request("create_wallet"))["address"]
+            receiver = (await client.request("create_wallet"))["address"]
+            await client.request("transfer", sender=sender, receiver=receiver, amount=1)
+            probe = (await client.request("probe"))["stdout"]
+            await client.close()
+            await server.stop()
+            return probe
+
+        output = io.StringIO()
+        with contextlib.redirect_stdout(output):
+            probe = asyncio.run(run())
+            self.assertEqual(probe, id(sys.stdout))
+        self.assertEqual(output.getvalue(), "")
+
+
+    # A wallet created with a password over a persistent server keeps its password when the ledger is reopened after a crash
+    def test_wallet_password_is_persisted(self):
+        async def create_protected_wallet(blockchain):
+            server, client = await self.connect(blockchain, testing=False)
+            address = (await client.request("create_wallet", password="server check"))["address"]
+            await client.close()
+            await server.stop()
+            return address
+
+        with contextlib.redirect_stdout(io.StringIO()), tempfile.TemporaryDirectory() as store_path:
+            blockchain = Blockchain(store_path=store_path, checkpoint_interval=0)
+            address = asyncio.run(create_protected_wallet(blockchain))
+            blockchain.chain.close() # closed without a checkpoint, as after a crash: the wallet is rebuilt from the registry journal
+            blockchain.journal_file.close()
+            blockchain.history_file.close()
+            reopened = Blockchain(store_path=store_path, checkpoint_interval=0)
+            password = reopened.wallets[address].password if address in reopened.wallets else None
+            reopened.close()
+        self.assertEqual(password, "server check")
+
+
+    # A transfer queued by a batching server is sealed in a block by the block timer, without another transfer or a flush
+    def test_queued_transfer_is_sealed(self):
+        async def queue_transfer(blockchain):
+            server, client = await self.connect(blockchain)
+            sender = (await client.request("create_wallet"))["address"]
+            receiver = (await client.request("create_wallet"))["address"]
+            await client.request("transfer", sender=sender, receiver=receiver, amount=1)
+            queued = (await client.request("status"))["pending_transactions"]
+            await asyncio.sleep(0.5)
+            pending = (await client.request("status"))["pending_transactions"]
+            await client.close()
+            await server.stop()
+            return queued, pending
+
+        blockchain = Blockchain(batching=True, max_block_interval=50)
+        self.addCleanup(blockchain.close)
+        queued, pending = quietly(asyncio.run, queue_transfer(blockchain))
+        self.assertEqual((queued, pending), (1, 0))
+
+
+
+if __name__ == "__main__":
+    unittest.main()